@@ -1,5 +1,6 @@
 import streamlit as st
-from metascan.db import get_all_papers, verify_user, create_user
+from metascan.db import count_papers, verify_user, create_user
+from metascan.startup import start_background_warmup
 
 st.set_page_config(
     page_title="MetaScan Portal",
@@ -7,6 +8,10 @@ st.set_page_config(
     layout="wide"
 )
 
+# Optional (METASCAN_WARMUP=1): load models/index in the background while
+# the user logs in. Nothing heavy is imported on this page otherwise.
+start_background_warmup()
+
 # --- AUTHENTICATION STATE ---
 if "role" not in st.session_state:
     st.session_state["role"] = None
@@ -44,11 +49,9 @@ if st.session_state["role"]:
         st.success(f"Welcome back, {st.session_state['username']}.")
 
     # 2. Your Metrics (From your old code)
-    papers = get_all_papers()
-    
     c1, c2, c3 = st.columns(3)
     with c1:
-        st.metric("Total Papers Indexed", len(papers))
+        st.metric("Total Papers Indexed", count_papers())
     with c2:
         st.metric("Your Access Level", st.session_state["role"].upper())
     
@@ -0,0 +1,229 @@
+from collections import Counter
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne, ReplaceOne
+from metascan.db import db, papers_col
+
+# ---------------------------------------------------------
+# LIBRARY ANALYTICS (incremental counters)
+# ---------------------------------------------------------
+# Dashboards read small documents from the "paper_counters" collection
+# instead of scanning papers:
+#   {_id: "papers",  kind: "meta", n}        total papers
+#   {_id: "authors", kind: "meta", n}        distinct authors
+#   {_id: "<kind>:<key>", kind, key, n}      kind = category | year | author | keyword
+#
+# Every insert/delete in db.py applies its deltas with one $inc
+# bulk_write (record_papers). Counters that reach zero are removed, so the
+# number of author documents created/removed keeps "authors" current.
+#
+# The counters are built from the MongoDB aggregation pipelines below the
+# first time they are read. `python -m metascan.analytics` checks them
+# against the papers (--fix to repair drift, e.g. after papers were edited
+# directly in MongoDB; --rebuild to recount from scratch).
+
+UNCATEGORIZED = "Uncategorized"
+TOP_KEYWORDS = 10
+
+counters_col = db["paper_counters"]
+
+_counters_ready = False
+
+
+def ensure_counter_indexes():
+    counters_col.create_index([("kind", ASCENDING), ("n", DESCENDING)])
+
+
+# --- Pipelines (full scans, used to build and check the counters) ---
+def category_counts() -> dict:
+    pipeline = [
+        {"$project": {"_id": 0, "category": 1}},
+        {"$group": {"_id": {"$ifNull": ["$category", UNCATEGORIZED]}, "count": {"$sum": 1}}},
+    ]
+    counts = {}
+    for row in papers_col.aggregate(pipeline):
+        key = row["_id"] or UNCATEGORIZED
+        counts[key] = counts.get(key, 0) + row["count"]
+    return counts
+
+
+def year_counts() -> dict:
+    pipeline = [
+        {"$match": {"year": {"$gt": 0}}},
+        {"$group": {"_id": "$year", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] for row in papers_col.aggregate(pipeline)}
+
+
+def _unwound_counts(field) -> dict:
+    pipeline = [
+        {"$project": {"_id": 0, field: 1}},
+        {"$unwind": f"${field}"},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] for row in papers_col.aggregate(pipeline, allowDiskUse=True)
+            if isinstance(row["_id"], str) and row["_id"]}
+
+
+def author_counts() -> dict:
+    return _unwound_counts("authors")
+
+
+def keyword_counts() -> dict:
+    return _unwound_counts("keywords")
+
+
+def compute_counters() -> dict:
+    """
+    What every counter should hold, from the pipelines: {_id: doc}.
+    """
+    expected = {}
+    for kind, counts in (("category", category_counts()), ("year", year_counts()),
+                         ("author", author_counts()), ("keyword", keyword_counts())):
+        for key, n in counts.items():
+            expected[f"{kind}:{key}"] = {"kind": kind, "key": key, "n": n}
+    expected["papers"] = {"kind": "meta", "n": papers_col.count_documents({})}
+    expected["authors"] = {"kind": "meta", "n": sum(1 for doc in expected.values() if doc["kind"] == "author")}
+    return expected
+
+
+# --- Incremental updates (write hooks in db.py) ---
+def _values(value):
+    if isinstance(value, str):
+        return [value] if value else []
+    return [v for v in value or [] if isinstance(v, str) and v]
+
+
+def _paper_deltas(papers, sign):
+    deltas = Counter()
+    for paper in papers:
+        deltas[("category", paper.get("category") or UNCATEGORIZED)] += sign
+        year = paper.get("year") or 0
+        if isinstance(year, int) and year > 0:
+            deltas[("year", year)] += sign
+        for author in _values(paper.get("authors")):
+            deltas[("author", author)] += sign
+        for keyword in _values(paper.get("keywords")):
+            deltas[("keyword", keyword)] += sign
+    return {key: n for key, n in deltas.items() if n}
+
+
+def counters_ready() -> bool:
+    global _counters_ready
+    if not _counters_ready:
+        _counters_ready = counters_col.find_one({"_id": "papers"}, {"_id": 1}) is not None
+    return _counters_ready
+
+
+def record_papers(papers, sign=1):
+    """
+    Apply inserted (sign=1) or deleted (sign=-1) papers to the counters.
+    Skipped until the counters exist; the first read builds them.
+    """
+    if not papers:
+        return
+    try:
+        if not counters_ready():
+            return
+        deltas = _paper_deltas(papers, sign)
+        keys = list(deltas)
+        ops = [UpdateOne({"_id": f"{kind}:{key}"},
+                         {"$inc": {"n": deltas[kind, key]}, "$setOnInsert": {"kind": kind, "key": key}}, upsert=True)
+               for kind, key in keys]
+        ops.append(UpdateOne({"_id": "papers"}, {"$inc": {"n": sign * len(papers)}}))
+        result = counters_col.bulk_write(ops, ordered=False)
+
+        # Counters created just now come back in upserted_ids
+        new_authors = sum(1 for counter_id in result.upserted_ids.values() if counter_id.startswith("author:"))
+        removed_authors = 0
+        if sign < 0:
+            emptied = {"_id": {"$in": [f"{kind}:{key}" for kind, key in keys]}, "n": {"$lte": 0}}
+            removed_authors = counters_col.delete_many({**emptied, "kind": "author"}).deleted_count
+            counters_col.delete_many(emptied)
+        if new_authors or removed_authors:
+            counters_col.update_one({"_id": "authors"}, {"$inc": {"n": new_authors - removed_authors}})
+    except Exception as e:
+        print("Analytics counter update failed:", e)
+
+
+# --- Build / check ---
+def reconcile_counters(fix: bool = True) -> list:
+    """
+    Compare the stored counters with a full recount. Returns
+    [(_id, stored, actual), ...] for every mismatch and, when fix=True,
+    overwrites the wrong ones and removes stale ones.
+    """
+    global _counters_ready
+    expected = compute_counters()
+    stored = {doc["_id"]: doc.get("n", 0) for doc in counters_col.find({}, {"n": 1})}
+
+    drift = [(counter_id, stored.get(counter_id), doc["n"])
+             for counter_id, doc in expected.items() if stored.get(counter_id) != doc["n"]]
+    drift += [(counter_id, n, None) for counter_id, n in stored.items() if counter_id not in expected]
+
+    if fix and drift:
+        ops = [ReplaceOne({"_id": counter_id}, expected[counter_id], upsert=True)
+               for counter_id, _, actual in drift if actual is not None]
+        if ops:
+            counters_col.bulk_write(ops, ordered=False)
+        stale = [counter_id for counter_id, _, actual in drift if actual is None]
+        if stale:
+            counters_col.delete_many({"_id": {"$in": stale}})
+        counters_col.update_one({"_id": "papers"}, {"$set": {"reconciled_at": datetime.utcnow()}})
+        _counters_ready = True
+    return drift
+
+
+def rebuild_counters():
+    """
+    Drop and recount every counter.
+    """
+    global _counters_ready
+    counters_col.delete_many({})
+    _counters_ready = False
+    reconcile_counters(fix=True)
+
+
+# --- Reads ---
+def get_stats() -> dict:
+    """
+    Stats for the analytics page, from the counters (built on first use).
+    """
+    if not counters_ready():
+        rebuild_counters()
+
+    stats = {"total": 0, "unique_authors": 0, "categories": {}, "years": {}}
+    for doc in counters_col.find({"kind": {"$in": ["meta", "category", "year"]}}):
+        if doc["_id"] == "papers":
+            stats["total"] = doc.get("n", 0)
+        elif doc["_id"] == "authors":
+            stats["unique_authors"] = doc.get("n", 0)
+        elif doc.get("n", 0) > 0:
+            section = "categories" if doc["kind"] == "category" else "years"
+            stats[section][doc["key"]] = doc["n"]
+    stats["years"] = dict(sorted(stats["years"].items()))
+    stats["top_keywords"] = top_keywords()
+    return stats
+
+
+def top_keywords(limit: int = TOP_KEYWORDS) -> list:
+    cursor = counters_col.find({"kind": "keyword", "n": {"$gt": 0}}, {"key": 1, "n": 1})
+    return [(doc["key"], doc["n"]) for doc in cursor.sort([("n", DESCENDING), ("key", ASCENDING)]).limit(limit)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the paper statistics counters.")
+    parser.add_argument("--fix", action="store_true", help="Overwrite counters that don't match the papers")
+    parser.add_argument("--rebuild", action="store_true", help="Drop all counters and recount from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_counters()
+        print(f"Rebuilt counters: {get_stats()['total']} papers.")
+    else:
+        drift = reconcile_counters(fix=args.fix)
+        for counter_id, stored, actual in drift[:50]:
+            print(f"  {counter_id}: stored={stored} actual={actual}")
+        action = "fixed" if args.fix else "found (run with --fix to repair)"
+        print(f"{len(drift)} mismatched counters {action}.")
@@ -0,0 +1,327 @@
+import os
+import threading
+import numpy as np
+from metascan.vector_index import get_vector_index, normalise_embedding
+
+# ---------------------------------------------------------
+# APPROXIMATE NEAREST NEIGHBOUR SEARCH (IVF-FLAT)
+# ---------------------------------------------------------
+# A k-means coarse quantizer splits the embedding space into `nlist` cells.
+# Each cell keeps its papers' vectors (float16 to halve memory and scan
+# bandwidth). A query only scans the `nprobe` closest cells, then the best
+# candidates are re-scored exactly against the float32 vectors held by the
+# process-wide EmbeddingIndex.
+#
+# Recall / latency knobs:
+#   nprobe     - more cells scanned = better recall, slower
+#   rerank_k   - how many approximate candidates get exact scores
+
+IVF_PATH = os.path.join("indexes", "ivf.npz")
+
+# Below this size a brute-force scan is already fast and k-means is noisy.
+MIN_TRAIN_SIZE = 2048
+DEFAULT_NPROBE = 8
+
+# Tombstoned rows are reclaimed once they exceed this share of the index
+COMPACT_FRACTION = 0.1
+COMPACT_MIN = 256
+
+_ivf = None
+_ivf_lock = threading.Lock()
+_too_small_at = None  # vector count when the library was last too small to train
+
+
+class IVFIndex:
+    def __init__(self, centroids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        nlist, dim = self.centroids.shape
+        self.dim = dim
+        self._vectors = [np.zeros((0, dim), dtype=np.float16) for _ in range(nlist)]
+        self._ids = [np.empty(0, dtype=object) for _ in range(nlist)]
+        self._where = {}  # paper_id -> cell number
+        self._deleted = {}  # tombstoned paper_id -> cell number
+        self._lock = threading.RLock()
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, paper_id):
+        return str(paper_id) in self._where
+
+    def add_batch(self, paper_ids, matrix):
+        """
+        Assign normalised vectors to their closest centroid and append them.
+        """
+        if len(paper_ids) == 0:
+            return
+        matrix = np.asarray(matrix, dtype=np.float32)
+        paper_ids = [str(p) for p in paper_ids]
+        last = {p: i for i, p in enumerate(paper_ids)}  # an id given twice keeps its last vector
+        if len(last) < len(paper_ids):
+            rows = sorted(last.values())
+            paper_ids, matrix = [paper_ids[i] for i in rows], matrix[rows]
+        cells = _assign(matrix, self.centroids)
+        paper_ids = np.asarray(paper_ids, dtype=object)
+
+        with self._lock:
+            # Re-added ids lose their old row (live or tombstoned) first,
+            # so a paper never sits in the cells twice
+            self._purge([p for p in paper_ids if p in self._where or p in self._deleted])
+            for cell in np.unique(cells):
+                mask = cells == cell
+                self._vectors[cell] = np.vstack([self._vectors[cell], matrix[mask].astype(np.float16)])
+                self._ids[cell] = np.concatenate([self._ids[cell], paper_ids[mask]])
+                for paper_id in paper_ids[mask]:
+                    self._where[paper_id] = int(cell)
+
+    def add(self, paper_id, embedding):
+        vector = normalise_embedding(embedding)
+        if vector is None or vector.shape[0] != self.dim:
+            return False
+        self.add_batch([paper_id], vector[None, :])
+        return True
+
+    def remove(self, paper_id):
+        with self._lock:
+            return self._drop(str(paper_id))
+
+    def _drop(self, paper_id):
+        # Rows are tombstoned and filtered at query time, then reclaimed
+        # in one pass once there are enough to be worth rewriting the cells.
+        cell = self._where.pop(paper_id, None)
+        if cell is None:
+            return False
+        self._deleted[paper_id] = cell
+        if len(self._deleted) > max(COMPACT_MIN, COMPACT_FRACTION * len(self._where)):
+            self._purge(list(self._deleted))
+        return True
+
+    def _purge(self, paper_ids):
+        # Physically remove these papers' rows from their cells.
+        by_cell = {}
+        for paper_id in paper_ids:
+            cell = self._where.pop(paper_id, None)
+            dead_cell = self._deleted.pop(paper_id, None)
+            for c in {cell, dead_cell} - {None}:
+                by_cell.setdefault(c, set()).add(paper_id)
+        for cell, ids in by_cell.items():
+            keep = np.array([p not in ids for p in self._ids[cell]], dtype=bool)
+            self._vectors[cell] = self._vectors[cell][keep]
+            self._ids[cell] = self._ids[cell][keep]
+
+    def compact(self):
+        with self._lock:
+            if self._deleted:
+                self._purge(list(self._deleted))
+
+    def candidates(self, query, nprobe=DEFAULT_NPROBE, limit=100):
+        """
+        Approximate search: scan the nprobe closest cells and return
+        [(approx_score, paper_id), ...] for the best `limit` hits.
+        """
+        nprobe = max(1, min(nprobe, self.nlist))
+        cell_scores = self.centroids @ query
+        probe = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+
+        with self._lock:
+            vectors = [self._vectors[c] for c in probe if len(self._ids[c])]
+            ids = [self._ids[c] for c in probe if len(self._ids[c])]
+            if not ids:
+                return []
+            ids = np.concatenate(ids)
+            # Only tombstones of the probed cells matter (bounded by _drop)
+            alive = None
+            probed = set(probe.tolist())
+            if any(cell in probed for cell in self._deleted.values()):
+                alive = np.array([p not in self._deleted for p in ids], dtype=bool)
+
+        scores = np.vstack(vectors).astype(np.float32) @ query
+        if alive is not None:
+            ids, scores = ids[alive], scores[alive]
+
+        k = min(limit, scores.shape[0])
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [(float(scores[i]), ids[i]) for i in top]
+
+    def search(self, query_embedding, top_k=5, nprobe=DEFAULT_NPROBE, rerank_k=None, min_score=None):
+        """
+        Return [(score, paper_id), ...] best first. Candidate scores come from
+        the float16 cells; the final ranking is exact (float32).
+        """
+        query = normalise_embedding(query_embedding)
+        if query is None or top_k <= 0 or query.shape[0] != self.dim:
+            return []
+        if rerank_k is None:
+            rerank_k = max(4 * top_k, 50)
+
+        candidates = self.candidates(query, nprobe=nprobe, limit=max(rerank_k, top_k))
+        return get_vector_index().rerank(query, [paper_id for _, paper_id in candidates],
+                                         top_k=top_k, min_score=min_score)
+
+    # --- Persistence ---
+    def save(self, path=IVF_PATH):
+        self.compact()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            sizes = np.array([len(ids) for ids in self._ids], dtype=np.int64)
+            vectors = np.vstack(self._vectors) if len(self._where) else np.zeros((0, self.dim), np.float16)
+            ids = np.concatenate(self._ids).astype(str) if len(self._where) else np.empty(0, dtype=str)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, sizes=sizes, vectors=vectors, ids=ids)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=IVF_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data["centroids"])
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            vectors, ids = data["vectors"], data["ids"].astype(object)
+        for cell in range(index.nlist):
+            start, end = offsets[cell], offsets[cell + 1]
+            index._vectors[cell] = vectors[start:end]
+            index._ids[cell] = ids[start:end]
+            for paper_id in index._ids[cell]:
+                index._where[paper_id] = cell
+        return index
+
+
+def _assign(matrix, centroids, chunk=8192):
+    cells = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], chunk):
+        cells[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+    return cells
+
+
+def train_kmeans(matrix, nlist, iterations=12, sample_size=100_000, seed=0):
+    """
+    Spherical k-means on (a sample of) normalised vectors.
+    Returns an (nlist, dim) float32 array of unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    if n > sample_size:
+        matrix = matrix[rng.choice(n, sample_size, replace=False)]
+        n = sample_size
+    nlist = max(1, min(nlist, n))
+
+    centroids = matrix[rng.choice(n, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        cells = _assign(matrix, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, cells, matrix)
+        counts = np.bincount(cells, minlength=nlist)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed dead cells with random points
+            sums[empty] = matrix[rng.choice(n, int(empty.sum()), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def build_ivf_index(nlist=None):
+    """
+    Train a new IVF index over everything in the process-wide EmbeddingIndex.
+    Returns None if there are too few vectors for IVF to be worthwhile.
+    """
+    ids, matrix = get_vector_index().snapshot()
+    if len(ids) < MIN_TRAIN_SIZE:
+        return None
+    if nlist is None:
+        nlist = int(4 * np.sqrt(len(ids)))
+
+    index = IVFIndex(train_kmeans(matrix, nlist))
+    index.add_batch(ids, matrix)
+    return index
+
+
+def _sync_with_vector_index(index):
+    """
+    A persisted IVF file can lag behind MongoDB (other processes, deletes
+    while this one was down). Add/remove the difference.
+    """
+    vector_index = get_vector_index()
+    ids, _ = vector_index.snapshot(copy=False)
+    live = set(ids)
+    stale = [p for p in list(index._where) if p not in live]
+    for paper_id in stale:
+        index.remove(paper_id)
+
+    missing = [p for p in ids if p not in index]
+    if missing:
+        found_ids, matrix = vector_index.vectors_for(missing)
+        index.add_batch(found_ids, matrix)
+
+
+def get_ivf_index():
+    """
+    Return the process-wide IVF index: load it from disk if present,
+    otherwise train and persist a new one. None means "use exact search".
+    """
+    global _ivf, _too_small_at
+    if _ivf is None:
+        # Too small last time: don't snapshot and retry until it has grown
+        if _too_small_at is not None and len(get_vector_index()) <= _too_small_at:
+            return None
+        with _ivf_lock:
+            if _ivf is None:
+                if os.path.exists(IVF_PATH):
+                    try:
+                        _ivf = IVFIndex.load(IVF_PATH)
+                        _sync_with_vector_index(_ivf)
+                    except Exception as e:
+                        print("Failed to load IVF index, retraining:", e)
+                        _ivf = None
+                if _ivf is None:
+                    _ivf = build_ivf_index()
+                    if _ivf is not None:
+                        _ivf.save(IVF_PATH)
+                        _too_small_at = None
+                    else:
+                        _too_small_at = max(len(get_vector_index()), MIN_TRAIN_SIZE - 1)
+    return _ivf
+
+
+def rebuild_ivf_index(nlist=None):
+    """
+    Retrain the coarse quantizer (e.g. after the library has grown a lot).
+    """
+    global _ivf
+    with _ivf_lock:
+        _ivf = build_ivf_index(nlist)
+        if _ivf is not None:
+            _ivf.save(IVF_PATH)
+    return _ivf
+
+
+def ann_index_paper(paper_id, embedding):
+    if _ivf is not None and embedding is not None and len(embedding) > 0:
+        _ivf.add(paper_id, embedding)
+
+
+def ann_unindex_paper(paper_id):
+    if _ivf is not None:
+        _ivf.remove(paper_id)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train and persist the IVF semantic search index.")
+    parser.add_argument("--nlist", type=int, default=None, help="number of k-means cells (default 4*sqrt(N))")
+    args = parser.parse_args()
+
+    index = rebuild_ivf_index(args.nlist)
+    if index is None:
+        print(f"Fewer than {MIN_TRAIN_SIZE} embeddings: exact search will be used.")
+    else:
+        print(f"IVF index with {len(index)} vectors in {index.nlist} cells saved to {IVF_PATH}")
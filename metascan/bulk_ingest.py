@@ -0,0 +1,233 @@
+"""
+Bulk PDF ingestion from a directory.
+
+    python -m metascan.bulk_ingest /path/to/archive --processes 8 --uploaded-by admin
+
+PDF parsing and author NER (one nlp.pipe per chunk of files) fan out
+over a process pool; keywords, categories and embeddings are computed
+in batches in the parent, and
+papers are written with insert_many. Every processed file is appended to
+a manifest (path, size, mtime, SHA-256, paper id), so an interrupted run
+picks up where it stopped and unchanged files are never re-read.
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from metascan.db import papers_col, add_papers
+from metascan.storage import save_pdf_permanently, file_sha256
+
+MANIFEST_PATH = os.path.join("indexes", "bulk_manifest.jsonl")
+DEFAULT_BATCH_SIZE = 64
+EXTRACT_CHUNK_SIZE = 8  # files per worker task (author NER is piped per chunk)
+
+_known_hashes = frozenset()
+
+
+def find_pdfs(directory: str) -> list:
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(paths)
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> dict:
+    """
+    {absolute file path: last manifest entry}
+    """
+    entries = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    entries[entry["path"]] = entry
+    return entries
+
+
+def _unchanged(path, entry) -> bool:
+    # Failed files are retried; done/duplicate ones are skipped if untouched
+    if not entry or entry.get("status") not in ("done", "duplicate"):
+        return False
+    stat = os.stat(path)
+    return entry.get("size") == stat.st_size and entry.get("mtime") == int(stat.st_mtime)
+
+
+# ---------------------------------------------------------
+# WORKER PROCESS SIDE
+# ---------------------------------------------------------
+def _init_worker(known_hashes):
+    global _known_hashes
+    _known_hashes = known_hashes
+
+
+def _extract_one(path: str) -> dict:
+    """
+    Hash + layout extraction for one file (no enrichment: keywords,
+    category and embedding are batched in the parent, author NER per
+    chunk in _extract_chunk).
+    """
+    from metascan.pdf_extractor import extract_pdf_data_visual
+
+    stat = os.stat(path)
+    result = {"path": path, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        result["sha256"] = file_sha256(data)
+        if result["sha256"] in _known_hashes:
+            result["status"] = "duplicate"
+            return result
+
+        # Parse the bytes already in memory (the file is read once)
+        extracted = extract_pdf_data_visual(data, enrich=False, filename=os.path.basename(path), authors=False)
+        result.update(status="extracted", extracted=extracted)
+    except Exception as e:
+        result.update(status="failed", error=str(e))
+    return result
+
+
+def _extract_chunk(paths: list) -> list:
+    """
+    _extract_one for several files, then author NER for all of them in
+    one nlp.pipe pass, then the arXiv lookup.
+    """
+    from metascan.nlp import person_names
+    from metascan.pipeline import merge_arxiv_metadata
+
+    results = [_extract_one(path) for path in paths]
+    ready = [r for r in results if r["status"] == "extracted"]
+    names = person_names([r["extracted"].pop("author_text") for r in ready])
+    for r, authors in zip(ready, names):
+        try:
+            r["extracted"]["authors"] = authors
+            r["merged"] = merge_arxiv_metadata(r["extracted"])
+            r["extracted"].pop("full_text", None)  # not stored; don't ship it back to the parent
+        except Exception as e:
+            r.update(status="failed", error=str(e))
+    return results
+
+
+# ---------------------------------------------------------
+# PARENT SIDE
+# ---------------------------------------------------------
+def _flush(batch, manifest_file, uploaded_by, log):
+    from metascan.enrich import extract_keywords_batch, assign_categories
+    from metascan.embeddings import generate_embeddings, embedding_text
+
+    ready = [r for r in batch if r["status"] == "extracted"]
+
+    # Skip files already in the library (or twice in this batch)
+    hashes = [r["sha256"] for r in ready]
+    seen = {p["source_hash"] for p in papers_col.find({"source_hash": {"$in": hashes}}, {"source_hash": 1})}
+    unique = []
+    for r in ready:
+        if r["sha256"] in seen:
+            r["status"] = "duplicate"
+        else:
+            seen.add(r["sha256"])
+            unique.append(r)
+
+    abstracts = [r["extracted"]["abstract"] for r in unique]
+    keywords = extract_keywords_batch(abstracts)
+    categories = assign_categories(abstracts)
+    vectors = generate_embeddings(
+        [embedding_text(r["merged"]["title"], r["extracted"]["abstract"]) for r in unique], persist=True
+    )
+
+    docs = []
+    for r, kw, category, vector in zip(unique, keywords, categories, vectors):
+        docs.append({
+            "title": r["merged"]["title"],
+            "authors": r["merged"]["authors"],
+            "year": r["merged"]["year"],
+            "journal": r["merged"]["journal"],
+            "abstract": r["extracted"]["abstract"],
+            "keywords": kw,
+            "tags": kw,
+            "category": category,
+            "file_path": save_pdf_permanently(r["path"]),
+            "embedding": vector,
+            "uploaded_by": uploaded_by,
+            "source_hash": r["sha256"],
+        })
+
+    errors = {}
+    inserted = set(add_papers(docs, errors=errors))
+    for i, (r, doc) in enumerate(zip(unique, docs)):
+        if str(doc.get("_id")) in inserted:
+            r["status"], r["paper_id"] = "done", str(doc["_id"])
+        elif i in errors:
+            # Not a duplicate: retried on the next run. The stored copy is
+            # kept in case the write did reach the database.
+            r.update(status="failed", error=errors[i])
+        else:
+            r["status"] = "duplicate"  # lost a race with another ingester
+            os.remove(doc["file_path"])
+
+    for r in batch:
+        entry = {k: r.get(k) for k in ("path", "size", "mtime", "sha256", "status", "paper_id", "error")}
+        manifest_file.write(json.dumps(entry) + "\n")
+    manifest_file.flush()
+
+    if log:
+        failed = sum(1 for r in batch if r["status"] == "failed")
+        log(f"Inserted {len(inserted)}, skipped {len(batch) - len(inserted) - failed}, failed {failed}")
+    return len(inserted)
+
+
+def ingest_directory(directory: str, processes: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                     uploaded_by: str = "bulk-import", manifest_path: str = MANIFEST_PATH, log=print) -> dict:
+    """
+    Ingest every PDF under `directory`. Returns counts by outcome.
+    """
+    manifest = load_manifest(manifest_path)
+    paths = [p for p in find_pdfs(directory) if not _unchanged(p, manifest.get(p))]
+    known = frozenset(e["sha256"] for e in manifest.values()
+                      if e.get("status") in ("done", "duplicate") and e.get("sha256"))
+    if log:
+        log(f"{len(paths)} PDFs to process ({len(manifest)} already in manifest).")
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    processes = processes or os.cpu_count() or 1
+    inserted = 0
+    started = time.time()
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest_file, \
+            ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker,
+                                initargs=(known,)) as pool:
+        batch = []
+        done = 0
+        chunks = [paths[i:i + EXTRACT_CHUNK_SIZE] for i in range(0, len(paths), EXTRACT_CHUNK_SIZE)]
+        for results in pool.map(_extract_chunk, chunks):
+            batch.extend(results)
+            done += len(results)
+            if len(batch) >= batch_size:
+                inserted += _flush(batch, manifest_file, uploaded_by, log)
+                batch = []
+                if log:
+                    log(f"{done}/{len(paths)} files, {done / (time.time() - started):.1f} files/s")
+        if batch:
+            inserted += _flush(batch, manifest_file, uploaded_by, log)
+
+    return {"files": len(paths), "inserted": inserted}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs.")
+    parser.add_argument("directory")
+    parser.add_argument("--processes", type=int, default=None, help="extraction processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--uploaded-by", default="bulk-import")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    args = parser.parse_args()
+
+    summary = ingest_directory(args.directory, args.processes, args.batch_size, args.uploaded_by, args.manifest)
+    print(f"Done: {summary['inserted']} papers inserted from {summary['files']} files.")
@@ -1,66 +1,301 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument, ASCENDING, TEXT
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from datetime import datetime
 from bson.objectid import ObjectId
 import os
-import streamlit as st
+import threading
 # MongoDB connection URL (local)
 # CONNECTION SETUP
 # ---------------------------------------------------------------------------
-# This logic checks if we are on the Cloud or on your Laptop
-try:
-    # Try to get the secret from Streamlit Cloud
-    MONGO_URI = st.secrets["MONGO_URI"]
-except:
-    # If fails (running locally on laptop), use your local default
-    MONGO_URI = "mongodb://localhost:27017/"
+# Nothing connects at import: the client is created on first use and the
+# index check then runs in a background thread, so pages that never touch
+# the database (and the login page's first render) don't wait on MongoDB.
 
 # Database name
 DB_NAME = "metascan_db"
 
-# Connect to MongoDB
-# We add a 30s timeout so it doesn't hang forever if the link is bad
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
-db = client[DB_NAME]
+_client = None
+_client_lock = threading.Lock()
+
+def _mongo_uri():
+    # This logic checks if we are on the Cloud or on your Laptop
+    try:
+        # Try to get the secret from Streamlit Cloud
+        import streamlit as st
+        return st.secrets["MONGO_URI"]
+    except:
+        # If fails (running locally on laptop), use your local default
+        return "mongodb://localhost:27017/"
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # We add a 30s timeout so it doesn't hang forever if the link is bad
+                _client = MongoClient(_mongo_uri(), serverSelectionTimeoutMS=30000)
+                threading.Thread(target=_ensure_indexes_quietly, name="metascan-indexes", daemon=True).start()
+    return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+class _LazyCollection:
+    """
+    Stands in for a pymongo Collection until first use, so modules can
+    keep `from metascan.db import papers_col` without connecting.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f"<lazy collection {DB_NAME}.{self.name}>"
+
+class _LazyDatabase:
+    def __getitem__(self, name):
+        return _LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+db = _LazyDatabase()
 
 # Collection
 papers_col = db["papers"]
 users_col = db["users"] # Defined early so functions can use it
+# Tombstones of deleted papers, read by other processes to drop them from
+# their in-memory indexes (see vector_index.sync_vector_index)
+deleted_col = db["deleted_papers"]
+
+# EMBEDDING STORAGE
+# Embeddings are written as packed Binary blobs (see vector_codec.py).
+# float32 is exact; float16 / int8 trade a little precision for size.
+EMBEDDING_DTYPE = os.environ.get("METASCAN_EMBEDDING_DTYPE", "float32")
+
+def pack_embedding(embedding):
+    """
+    Convert an embedding (list/array) to its stored form.
+    Already-packed or empty values are returned unchanged.
+    """
+    if embedding is None or isinstance(embedding, bytes) or len(embedding) == 0:
+        return embedding
+    from metascan.embeddings import MODEL_NAME
+    from metascan.vector_codec import encode_embedding
+    return encode_embedding(embedding, dtype=EMBEDDING_DTYPE, model=MODEL_NAME)
+
+# Stored for search/dedup only; left out of listings by default
+HIDDEN_FIELDS = {"embedding": 0, "minhash": 0, "lsh_bands": 0}
+
+def _decode_paper(paper):
+    """Turn a stored embedding back into a list of floats."""
+    if paper and "embedding" in paper:
+        from metascan.vector_codec import decode_embedding
+        paper["embedding"] = decode_embedding(paper["embedding"])
+    return paper
+
+def _prepare_paper(data: dict):
+    """
+    Add timestamps and pack the embedding in place.
+    Returns the original (unpacked) embedding for the in-memory indexes.
+    """
+    # Ids are assigned here rather than by insert so the dedup stage can
+    # point a paper at an earlier one from the same batch
+    data.setdefault("_id", ObjectId())
+    data["created_at"] = datetime.utcnow().isoformat()
+    embedding = data.get("embedding")
+    if embedding is not None:
+        data["embedding"] = pack_embedding(embedding)
+        if len(embedding) > 0:
+            data["embedded_at"] = datetime.utcnow()
+    return embedding
+
+def _resolve_duplicates(papers, embeddings):
+    from metascan.dedup import resolve_duplicates
+    try:
+        return resolve_duplicates(papers, embeddings)
+    except Exception as e:
+        print("Duplicate check failed:", e)
+        return [None] * len(papers)
 
 def add_paper(data: dict):
     """
     Insert one research paper document into MongoDB.
     Automatically adds created_at timestamp.
+    If the dedup policy skips or merges it as a duplicate (see dedup.py),
+    nothing is inserted and the existing paper's id is returned.
     """
-    data["created_at"] = datetime.utcnow().isoformat()
+    embedding = _prepare_paper(data)
+    existing = _resolve_duplicates([data], [embedding])[0]
+    if existing is not None:
+        return existing
     result = papers_col.insert_one(data)
-    return str(result.inserted_id)
+    paper_id = str(result.inserted_id)
+    _after_insert(paper_id, {**data, "embedding": embedding})
+    return paper_id
+
+def add_papers(papers: list, errors: dict = None) -> list:
+    """
+    Insert many papers with one insert_many(ordered=False).
+    Documents rejected by a unique index (e.g. an already ingested
+    source_hash) or by the dedup stage are skipped. Returns the inserted
+    ids, in input order.
+    Documents rejected for any other reason are reported in `errors`
+    ({input index: message}) when given, and printed.
+    """
+    if not papers:
+        return []
+    embeddings = [_prepare_paper(p) for p in papers]
+    duplicates = _resolve_duplicates(papers, embeddings)
+    kept = [(i, p, emb) for i, (p, emb, existing) in enumerate(zip(papers, embeddings, duplicates))
+            if existing is None]
+    if not kept:
+        return []
+    positions = [i for i, _, _ in kept]
+    papers, embeddings = [p for _, p, _ in kept], [emb for _, _, emb in kept]
+
+    failed = set()
+    try:
+        papers_col.insert_many(papers, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            if err.get("code") != 11000:  # not a duplicate key: a real failure
+                print(f"Paper insert failed ({err.get('code')}):", err.get("errmsg"))
+                if errors is not None:
+                    errors[positions[err["index"]]] = err.get("errmsg") or f"write error {err.get('code')}"
+        for err in e.details.get("writeConcernErrors", []):
+            print("Paper insert write concern error:", err.get("errmsg"))
+
+    # insert_many sets _id on each document client-side
+    inserted = [(p, emb) for i, (p, emb) in enumerate(zip(papers, embeddings)) if i not in failed]
+    _after_insert_many([(str(p["_id"]), {**p, "embedding": emb}) for p, emb in inserted])
+    return [str(p["_id"]) for p, _ in inserted]
 
 def get_paper(paper_id: str):
     """
     Fetch a single paper using its ObjectId.
     """
     try:
-        return papers_col.find_one({"_id": ObjectId(paper_id)})
+        return _decode_paper(papers_col.find_one({"_id": ObjectId(paper_id)}))
     except:
         return None
 
-def search_papers(query: str):
+def get_all_papers():
     """
-    Basic text search using regex across title, abstract, and keywords.
+    Return all documents from the collection.
+    Prefer iter_papers() with a field list for listings.
     """
-    return list(papers_col.find({
-        "$or": [
-            {"title": {"$regex": query, "$options": "i"}},
-            {"abstract": {"$regex": query, "$options": "i"}},
-            {"keywords": {"$regex": query, "$options": "i"}}
-        ]
-    }))
+    return [_decode_paper(p) for p in papers_col.find()]
 
-def get_all_papers():
+def iter_papers(fields=None, query=None, batch_size: int = 500):
     """
-    Return all documents from the collection.
+    Stream papers with only the requested fields.
+    fields=None returns whole documents; _id is always included.
+    """
+    projection = {f: 1 for f in fields} if fields else None
+    cursor = papers_col.find(query or {}, projection, batch_size=batch_size)
+    for paper in cursor:
+        yield _decode_paper(paper)
+
+def fetch_papers_ranked(hits, projection=None, query=None, chunk_size: int = 10000):
+    """
+    Turn [(score, paper_id), ...] into [(score, paper_doc), ...] with $in
+    queries, preserving rank order and skipping ids that no longer exist
+    (or that don't match the optional extra `query` filter).
+    Embeddings (and dedup signatures) are left out unless a projection
+    asks for them.
+    """
+    if not hits:
+        return []
+    if projection is None:
+        projection = HIDDEN_FIELDS
+
+    object_ids = [ObjectId(paper_id) for _, paper_id in hits]
+    docs = {}
+    for start in range(0, len(object_ids), chunk_size):
+        chunk_filter = {"_id": {"$in": object_ids[start:start + chunk_size]}}
+        if query:
+            chunk_filter.update(query)
+        for d in papers_col.find(chunk_filter, projection):
+            docs[str(d["_id"])] = _decode_paper(d)
+    return [(score, docs[str(paper_id)]) for score, paper_id in hits if str(paper_id) in docs]
+
+def paginate_papers(query=None, limit: int = 20, cursor: str = None, projection=None, with_total: bool = False):
+    """
+    One page of papers, newest first, using keyset pagination on _id
+    (no skip(), so deep pages cost the same as the first one).
+
+    Returns {"results": [...], "next_cursor": str or None, "total": int or None}.
+    Pass next_cursor back in to get the following page.
+    """
+    if projection is None:
+        projection = HIDDEN_FIELDS
+    page_filter = dict(query or {})
+    if cursor:
+        page_filter = {"$and": [page_filter, {"_id": {"$lt": ObjectId(cursor)}}]}
+
+    # Fetch one extra document to know whether another page exists
+    docs = list(papers_col.find(page_filter, projection).sort("_id", -1).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    return {
+        "results": [_decode_paper(d) for d in docs],
+        "next_cursor": str(docs[-1]["_id"]) if has_more else None,
+        "total": count_papers(query) if with_total else None,
+    }
+
+def count_papers(query=None) -> int:
+    """
+    Count papers. Without a filter this reads collection metadata
+    (estimated_document_count) instead of scanning.
+    """
+    if not query:
+        return papers_col.estimated_document_count()
+    return papers_col.count_documents(query)
+
+def update_embeddings(embeddings: dict) -> int:
+    """
+    Store many embeddings at once ({paper_id: embedding}) with one bulk_write.
+    Returns the number of modified documents.
     """
-    return list(papers_col.find())
+    ops = [
+        UpdateOne({"_id": ObjectId(paper_id)},
+                  {"$set": {"embedding": pack_embedding(embedding), "embedded_at": datetime.utcnow()}})
+        for paper_id, embedding in embeddings.items()
+        if embedding is not None and len(embedding) > 0
+    ]
+    if not ops:
+        return 0
+
+    result = papers_col.bulk_write(ops, ordered=False)
+    for paper_id, embedding in embeddings.items():
+        _safely("vector indexing", _reindex_embedding, str(paper_id), embedding)
+    from metascan.query_cache import bump_generation
+    bump_generation()  # semantic results change with the vectors
+    return result.modified_count
+
+def update_paper(paper_id: str, fields: dict) -> bool:
+    """
+    $set some fields of one paper, keeping the indexes, the search cache
+    and the statistics counters in step. An "embedding" is packed like
+    on insert.
+    """
+    fields = dict(fields)
+    embedding = fields.get("embedding")
+    if embedding is not None:
+        fields["embedding"] = pack_embedding(embedding)
+        fields["embedded_at"] = datetime.utcnow()
+    old = papers_col.find_one_and_update({"_id": ObjectId(paper_id)}, {"$set": fields},
+                                         projection={"embedding": 0, "minhash": 0},
+                                         return_document=ReturnDocument.BEFORE)
+    if old is None:
+        return False
+    _after_update(str(paper_id), old, {**old, **fields, "embedding": embedding})
+    return True
 
 def delete_paper(paper_id: str) -> bool:
     """
@@ -80,23 +315,95 @@ def delete_paper(paper_id: str) -> bool:
 
     # Delete DB record
     papers_col.delete_one({"_id": ObjectId(paper_id)})
+    try:
+        deleted_col.update_one({"_id": ObjectId(paper_id)}, {"$set": {"deleted_at": datetime.utcnow()}}, upsert=True)
+    except Exception as e:
+        print("Failed to record deletion:", e)
+    _after_delete(str(paper_id), paper)
     return True
 
-# ... (Keep your existing imports and paper functions) ...
+# ---------------------------------------------------------------------------
+# WRITE HOOKS
+# ---------------------------------------------------------------------------
+# In-process indexes are kept in sync here, the search result cache is
+# invalidated (query_cache.py) and the statistics counters are updated
+# (analytics.py). Imports are local because those modules import this one.
+# They run after the write has committed, so index failures are logged
+# rather than raised (the keyword index re-indexes missed papers in
+# text_index.index_missing_papers(); the vector index catches up on its
+# next sync or restart).
+
+def _safely(what, fn, *args):
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"Paper write saved but {what} failed:", e)
+
+def _after_insert(paper_id: str, data: dict):
+    from metascan.text_index import index_paper as index_text
+    from metascan.query_cache import bump_generation
+    from metascan.analytics import record_papers
+    _safely("vector indexing", _reindex_embedding, paper_id, data.get("embedding"))
+    _safely("keyword indexing", index_text, paper_id, data)
+    bump_generation()
+    record_papers([data])
+
+def _after_insert_many(items):
+    from metascan.text_index import index_new_papers
+    from metascan.query_cache import bump_generation
+    from metascan.analytics import record_papers
+    for paper_id, data in items:
+        _safely("vector indexing", _reindex_embedding, paper_id, data.get("embedding"))
+    _safely("keyword indexing", index_new_papers, items)
+    if items:
+        bump_generation()
+        record_papers([data for _, data in items])
+
+def _after_update(paper_id: str, old: dict, new: dict):
+    from metascan.text_index import index_paper as index_text
+    from metascan.query_cache import bump_generation
+    from metascan.analytics import record_papers
+    if new.get("embedding") is not None:
+        _safely("vector indexing", _reindex_embedding, paper_id, new["embedding"])
+    _safely("keyword indexing", index_text, paper_id, new)
+    bump_generation()
+    record_papers([old], sign=-1)
+    record_papers([new])
+
+def _reindex_embedding(paper_id: str, embedding):
+    from metascan.vector_index import index_paper
+    from metascan.ann import ann_index_paper
+    index_paper(paper_id, embedding)
+    ann_index_paper(paper_id, embedding)
+
+def _after_delete(paper_id: str, paper: dict):
+    from metascan.vector_index import unindex_paper
+    from metascan.ann import ann_unindex_paper
+    from metascan.text_index import unindex_paper as unindex_text
+    from metascan.query_cache import bump_generation
+    from metascan.analytics import record_papers
+    _safely("vector unindexing", unindex_paper, paper_id)
+    _safely("vector unindexing", ann_unindex_paper, paper_id)
+    _safely("keyword unindexing", unindex_text, paper_id)
+    bump_generation()
+    record_papers([paper], sign=-1)
 
-# NEW: Users Collection
-users_col = db["users"]
+# ... (Keep your existing imports and paper functions) ...
 
 def create_user(username, password):
     """Registers a new user. Returns True if successful, False if username exists."""
     if users_col.find_one({"username": username}):
         return False
-    users_col.insert_one({
-        "username": username,
-        "password": password,  # In a real app, hash this!
-        "role": "user",
-        "created_at": datetime.utcnow()
-    })
+    try:
+        users_col.insert_one({
+            "username": username,
+            "password": password,  # In a real app, hash this!
+            "role": "user",
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # Lost a race with another registration (unique index on username)
+        return False
     return True
 
 def verify_user(username, password):
@@ -105,4 +412,83 @@ def verify_user(username, password):
 
 def get_papers_by_user(username):
     """Fetches papers uploaded by a specific user."""
-    return list(papers_col.find({"uploaded_by": username}))
+    return [_decode_paper(p) for p in papers_col.find({"uploaded_by": username})]
+
+# ---------------------------------------------------------------------------
+# INDEXES
+# ---------------------------------------------------------------------------
+# Created once per process. create_index is a no-op when the index already
+# exists, so this is safe to run from every app worker.
+
+# Set METASCAN_MONGO_TEXT_INDEX=1 to also build MongoDB's own $text index
+# (not needed by the BM25 engine in text_index.py).
+MONGO_TEXT_INDEX = os.environ.get("METASCAN_MONGO_TEXT_INDEX", "0") == "1"
+
+PAPER_INDEXES = [
+    ([("uploaded_by", ASCENDING)], {}),
+    ([("year", ASCENDING)], {}),
+    ([("category", ASCENDING)], {}),
+    ([("year", ASCENDING), ("category", ASCENDING)], {}),
+    # SHA-256 of the source PDF; makes queued ingestion idempotent
+    ([("source_hash", ASCENDING)], {"unique": True, "sparse": True}),
+    # Lets each process's vector index pick up embeddings written elsewhere
+    ([("embedded_at", ASCENDING)], {}),
+    # MinHash LSH buckets for near-duplicate lookups (dedup.py)
+    ([("lsh_bands", ASCENDING)], {}),
+]
+# Tombstones only need to outlive the longest-running process's sync gap
+DELETED_INDEXES = [
+    ([("deleted_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+]
+USER_INDEXES = [
+    ([("username", ASCENDING)], {"unique": True}),
+]
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def ensure_indexes():
+    """
+    Create the indexes every query shape in the app relies on.
+    Failures (e.g. duplicate usernames blocking the unique index) are
+    printed and skipped so the app still starts.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if _indexes_ready:
+            return
+
+        wanted = [(papers_col, keys, opts) for keys, opts in PAPER_INDEXES]
+        wanted += [(users_col, keys, opts) for keys, opts in USER_INDEXES]
+        wanted += [(deleted_col, keys, opts) for keys, opts in DELETED_INDEXES]
+        if MONGO_TEXT_INDEX:
+            wanted.append((papers_col, [("title", TEXT), ("abstract", TEXT), ("keywords", TEXT)],
+                           {"weights": {"title": 3, "keywords": 2, "abstract": 1}}))
+
+        for col, keys, opts in wanted:
+            try:
+                col.create_index(keys, **opts)
+            except Exception as e:
+                print(f"Could not create index {keys} on {col.name}:", e)
+
+        from metascan.text_index import ensure_text_indexes
+        try:
+            ensure_text_indexes()
+        except Exception as e:
+            print("Could not create keyword index collections:", e)
+
+        from metascan.analytics import ensure_counter_indexes
+        try:
+            ensure_counter_indexes()
+        except Exception as e:
+            print("Could not create statistics counter index:", e)
+
+        _indexes_ready = True
+
+def _ensure_indexes_quietly():
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print("MongoDB index setup skipped:", e)
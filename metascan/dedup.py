@@ -0,0 +1,456 @@
+"""
+Duplicate detection for new and existing papers.
+
+    python -m metascan.dedup                      # report near-duplicate clusters
+    python -m metascan.dedup --backfill           # first sign papers stored before dedup existed
+    python -m metascan.dedup --embeddings --json duplicates.json
+
+Three checks, cheapest first:
+  1. exact    - SHA-256 of the stored PDF ("source_hash"; computed from
+                file_path if the caller didn't supply it)
+  2. minhash  - MinHash signature of the title + abstract word shingles,
+                split into LSH bands stored on the paper ("lsh_bands",
+                indexed), so candidates come from one $in query and are
+                confirmed by the estimated Jaccard similarity
+  3. semantic - cosine similarity against the in-memory vector index; only
+                in processes that already hold it (the app), so workers
+                and CLI imports never load the embedding matrix for this
+
+What happens to a near duplicate (METASCAN_DEDUP_POLICY):
+  "flag"  - insert it with duplicate_of = {paper_id, method, score} (default)
+  "skip"  - don't insert; add_paper returns the existing paper's id
+  "merge" - don't insert; fill the existing paper's missing fields
+            (abstract, year, authors, journal, embedding...) and union
+            its keywords
+  "off"   - no near-duplicate checks (the exact check still runs)
+Byte-identical files are always skipped (source_hash is unique).
+"""
+import hashlib
+import json
+import os
+import re
+import zlib
+import numpy as np
+from pymongo import UpdateOne
+from metascan.db import papers_col, update_paper
+from metascan.storage import file_sha256
+
+POLICIES = ("flag", "skip", "merge", "off")
+DEDUP_POLICY = os.environ.get("METASCAN_DEDUP_POLICY", "flag")
+EMBEDDING_CHECK = os.environ.get("METASCAN_DEDUP_EMBEDDINGS", "1") == "1"
+
+SHINGLE_SIZE = 3         # words per shingle
+MIN_SHINGLES = 10        # shorter texts get no signature (too noisy)
+NUM_PERM = 128
+BANDS, ROWS = 16, 8      # BANDS * ROWS == NUM_PERM; candidates from Jaccard ~0.7 up
+JACCARD_THRESHOLD = 0.8
+EMBEDDING_THRESHOLD = 0.97
+MAX_BUCKET = 50          # larger LSH buckets (boilerplate text) are ignored by the report
+
+# Universal hashing h(x) = (a * x + b) mod p. Fixed seed: signatures are
+# stored, so every process must use the same permutations.
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240101)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+# ---------------------------------------------------------
+# MINHASH / LSH
+# ---------------------------------------------------------
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    words = _WORD_RE.findall((text or "").lower())
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash_signature(text: str):
+    """
+    NUM_PERM uint32 minimum hashes of the text's shingles, or None if the
+    text is too short to compare.
+    """
+    grams = shingles(text)
+    if len(grams) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams),
+                         dtype=np.uint64, count=len(grams))
+    # (NUM_PERM, n_shingles) -> min over shingles; a * x < 2^62, no overflow
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def lsh_bands(signature) -> list:
+    return [f"{b}:{hashlib.blake2b(signature[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+            for b in range(BANDS)]
+
+
+def estimated_jaccard(a, b) -> float:
+    return float(np.mean(a == b))
+
+
+def _signature_text(paper: dict) -> str:
+    return f"{paper.get('title') or ''} {paper.get('abstract') or ''}"
+
+
+def _decode_signature(value):
+    return np.frombuffer(value, dtype="<u4") if value else None
+
+
+def signature_fields(paper: dict) -> dict:
+    """
+    {"minhash": bytes, "lsh_bands": [...]} for a paper, or {} if its text
+    is too short to sign.
+    """
+    signature = minhash_signature(_signature_text(paper))
+    if signature is None:
+        return {}
+    return {"minhash": signature.astype("<u4").tobytes(), "lsh_bands": lsh_bands(signature)}
+
+
+def sign_paper(paper: dict):
+    """
+    Store the signature fields on the document (in place) and return the
+    signature, or None.
+    """
+    fields = signature_fields(paper)
+    paper.update(fields)
+    return _decode_signature(fields.get("minhash"))
+
+
+def _content_hash(paper: dict):
+    if not paper.get("source_hash") and paper.get("file_path") and os.path.exists(paper["file_path"]):
+        with open(paper["file_path"], "rb") as f:
+            paper["source_hash"] = file_sha256(f.read())
+    return paper.get("source_hash")
+
+
+# ---------------------------------------------------------
+# INGEST STAGE (called by add_paper / add_papers)
+# ---------------------------------------------------------
+def _stored_near_matches(signatures):
+    """
+    {index: (paper_id, score)}: the best stored paper sharing an LSH band
+    with each signature and passing the Jaccard threshold.
+    """
+    bands = {i: lsh_bands(sig) for i, sig in signatures.items()}
+    wanted = list({band for paper_bands in bands.values() for band in paper_bands})
+    buckets, stored = {}, {}
+    for start in range(0, len(wanted), 10000):
+        cursor = papers_col.find({"lsh_bands": {"$in": wanted[start:start + 10000]}}, {"minhash": 1, "lsh_bands": 1})
+        for doc in cursor:
+            paper_id = str(doc["_id"])
+            stored[paper_id] = _decode_signature(doc.get("minhash"))
+            for band in doc.get("lsh_bands", []):
+                buckets.setdefault(band, set()).add(paper_id)
+
+    matches = {}
+    for i, sig in signatures.items():
+        candidates = {paper_id for band in bands[i] for paper_id in buckets.get(band, ())}
+        scored = [(estimated_jaccard(sig, stored[p]), p) for p in candidates if stored[p] is not None]
+        best = max(scored, default=None)
+        if best and best[0] >= JACCARD_THRESHOLD:
+            matches[i] = (best[1], best[0])
+    return matches
+
+
+def _batch_semantic_candidates(vectors, chunk_size: int = 1000):
+    """
+    {i: [(score, j), ...]} for earlier papers j < i in the same batch whose
+    embeddings are within EMBEDDING_THRESHOLD, best first.
+    """
+    rows = [i for i, v in vectors.items() if v is not None]
+    if len(rows) < 2:
+        return {}
+    matrix = np.vstack([vectors[i] for i in rows]).astype(np.float32)
+    candidates = {}
+    for start in range(0, len(rows), chunk_size):
+        scores = matrix[start:start + chunk_size] @ matrix.T
+        for offset, row in enumerate(scores):
+            position = start + offset
+            close = np.nonzero(row[:position] >= EMBEDDING_THRESHOLD)[0]
+            if close.size:
+                candidates[rows[position]] = sorted(((float(row[c]), rows[c]) for c in close), reverse=True)
+    return candidates
+
+
+def _semantic_match(embedding):
+    from metascan import vector_index
+    if vector_index._index is None:
+        return None  # not loaded in this process: don't build it just for dedup
+    hits = vector_index.get_vector_index().search(embedding, top_k=1, min_score=EMBEDDING_THRESHOLD)
+    return (hits[0][1], hits[0][0]) if hits else None
+
+
+def _canonical(paper_id: str) -> str:
+    """
+    Follow stored duplicate_of links to the paper a match was itself
+    flagged as a duplicate of.
+    """
+    from bson.objectid import ObjectId
+    seen = set()
+    while paper_id not in seen:
+        seen.add(paper_id)
+        doc = papers_col.find_one({"_id": ObjectId(paper_id)}, {"duplicate_of": 1})
+        target = ((doc or {}).get("duplicate_of") or {}).get("paper_id")
+        if not target:
+            break
+        paper_id = str(target)
+    return paper_id
+
+
+def resolve_duplicates(papers: list, embeddings: list, policy: str = None) -> list:
+    """
+    Dedup stage for papers about to be inserted (ids already assigned).
+    Signs every paper, then returns one entry per paper: None to insert
+    it, or the id of the existing paper it was skipped/merged into.
+    Matches are recorded on each paper as duplicate_of.
+    """
+    from metascan.vector_index import normalise_embedding
+
+    policy = policy or DEDUP_POLICY
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown dedup policy: {policy!r}")
+
+    # "off" only disables the near-duplicate stages; the exact check always runs
+    near_checks = policy != "off"
+    signatures = {i: sign_paper(p) for i, p in enumerate(papers)}
+    hashes = {i: _content_hash(p) for i, p in enumerate(papers)}
+    hashed = [h for h in hashes.values() if h]
+    known = {doc["source_hash"]: str(doc["_id"])
+             for doc in papers_col.find({"source_hash": {"$in": hashed}}, {"source_hash": 1})} if hashed else {}
+    stored_near = _stored_near_matches({i: s for i, s in signatures.items() if s is not None}) if near_checks else {}
+    vectors = {i: normalise_embedding(e) if near_checks and EMBEDDING_CHECK and e is not None else None
+               for i, e in enumerate(embeddings)}
+    batch_semantic = _batch_semantic_candidates(vectors)
+
+    outcome = []
+    kept = set()                             # batch indexes that will be inserted
+    kept_hashes, kept_bands = {}, {}         # source_hash / LSH band -> batch index
+    for i, paper in enumerate(papers):
+        if hashes[i] and (hashes[i] in known or hashes[i] in kept_hashes):
+            # Same file: never stored twice, whatever the policy
+            existing = known.get(hashes[i]) or str(papers[kept_hashes[hashes[i]]]["_id"])
+            paper["duplicate_of"] = {"paper_id": existing, "method": "exact", "score": 1.0, "action": "skip"}
+            outcome.append(existing)
+            continue
+
+        match = None
+        if i in stored_near:
+            match = (stored_near[i][0], "minhash", stored_near[i][1])
+        if match is None and near_checks and signatures[i] is not None:
+            mates = {j for band in paper.get("lsh_bands", []) for j in kept_bands.get(band, ())}
+            scored = [(estimated_jaccard(signatures[i], signatures[j]), j) for j in mates]
+            best = max(scored, default=None)
+            if best and best[0] >= JACCARD_THRESHOLD:
+                match = (str(papers[best[1]]["_id"]), "minhash", best[0])
+        if match is None and vectors[i] is not None:
+            mate = next(((score, j) for score, j in batch_semantic.get(i, []) if j in kept), None)
+            if mate:
+                match = (str(papers[mate[1]]["_id"]), "semantic", mate[0])
+            else:
+                semantic = _semantic_match(vectors[i])
+                if semantic:
+                    match = (semantic[0], "semantic", semantic[1])
+
+        if match is None or policy == "flag":
+            if match:
+                paper["duplicate_of"] = {"paper_id": match[0], "method": match[1], "score": round(match[2], 4)}
+            kept.add(i)
+            if hashes[i]:
+                kept_hashes[hashes[i]] = i
+            for band in paper.get("lsh_bands", []):
+                kept_bands.setdefault(band, []).append(i)
+            outcome.append(None)
+            continue
+
+        existing, method, score = match
+        mate = next((papers[j] for j in kept if str(papers[j]["_id"]) == existing), None)
+        if mate is None:
+            existing = _canonical(existing)
+        paper["duplicate_of"] = {"paper_id": existing, "method": method, "score": round(score, 4), "action": policy}
+        if policy == "merge":
+            if mate is not None:
+                # Batch-mate not inserted yet: fold this one into it
+                mate.update(merged_fields(mate, paper))
+            else:
+                merge_into(existing, paper, embeddings[i])
+        outcome.append(existing)
+    return outcome
+
+
+# ---------------------------------------------------------
+# MERGE
+# ---------------------------------------------------------
+def _missing(value) -> bool:
+    return value in (None, "", [], 0, "Unknown")
+
+
+def merged_fields(existing: dict, paper: dict) -> dict:
+    """
+    Fields of `existing` to update from its duplicate `paper`: empty
+    fields are filled, keywords/tags are unioned.
+    """
+    updates = {}
+    for field in ("abstract", "authors", "year", "journal", "arxiv_id", "category"):
+        if _missing(existing.get(field)) and not _missing(paper.get(field)):
+            updates[field] = paper[field]
+    for field in ("keywords", "tags"):
+        combined = list(dict.fromkeys((existing.get(field) or []) + (paper.get(field) or [])))
+        if combined != (existing.get(field) or []):
+            updates[field] = combined
+    if "abstract" in updates:
+        for field in ("minhash", "lsh_bands"):
+            if field in paper:
+                updates[field] = paper[field]
+    return updates
+
+
+def merge_into(paper_id: str, paper: dict, embedding=None) -> bool:
+    """
+    Merge a duplicate's metadata into a stored paper.
+    """
+    from bson.objectid import ObjectId
+    existing = papers_col.find_one({"_id": ObjectId(paper_id)}, {"minhash": 0})
+    if existing is None:
+        return False
+    updates = merged_fields(existing, paper)
+    if _missing(existing.get("embedding")) and embedding is not None and len(embedding) > 0:
+        updates["embedding"] = embedding
+    return update_paper(paper_id, updates) if updates else True
+
+
+# ---------------------------------------------------------
+# BATCH REPORT (existing papers)
+# ---------------------------------------------------------
+def backfill_signatures(batch_size: int = 1000, progress=print) -> int:
+    """
+    Sign papers stored before dedup existed.
+    """
+    signed = 0
+    ops = []
+    cursor = papers_col.find({"lsh_bands": {"$exists": False}}, {"title": 1, "abstract": 1}, batch_size=batch_size)
+    for paper in cursor:
+        # Unsignable texts get an empty band list so they aren't revisited
+        fields = signature_fields(paper) or {"lsh_bands": []}
+        ops.append(UpdateOne({"_id": paper["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            signed += papers_col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+            if progress:
+                progress(f"Signed {signed} papers...")
+    if ops:
+        signed += papers_col.bulk_write(ops, ordered=False).modified_count
+    return signed
+
+
+def _candidate_pairs(max_bucket: int = MAX_BUCKET):
+    """
+    Pairs of papers sharing at least one LSH band, grouped server-side
+    (never an all-pairs comparison).
+    """
+    pipeline = [
+        {"$match": {"lsh_bands.0": {"$exists": True}}},
+        {"$project": {"lsh_bands": 1}},
+        {"$unwind": "$lsh_bands"},
+        {"$group": {"_id": "$lsh_bands", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1, "$lte": max_bucket}}},
+    ]
+    pairs = set()
+    for bucket in papers_col.aggregate(pipeline, allowDiskUse=True):
+        ids = sorted(str(i) for i in bucket["ids"])
+        pairs.update((a, b) for x, a in enumerate(ids) for b in ids[x + 1:])
+    return pairs
+
+
+def _semantic_pairs(top_k: int = 3):
+    # One ANN query per paper (IVF when the library is large enough)
+    from metascan.semantic_search import find_nearest
+    from metascan.vector_index import get_vector_index
+    ids, matrix = get_vector_index().snapshot(copy=False)
+    pairs = {}
+    for paper_id, vector in zip(ids, matrix):
+        for score, other in find_nearest(vector, top_k=top_k + 1, engine="ivf", min_score=EMBEDDING_THRESHOLD):
+            if other != paper_id:
+                pairs[tuple(sorted((paper_id, other)))] = score
+    return pairs
+
+
+def find_duplicate_clusters(use_embeddings: bool = False, max_bucket: int = MAX_BUCKET) -> list:
+    """
+    Groups of existing papers that look like the same work.
+    Returns [{"paper_ids": [...], "pairs": [(a, b, method, score), ...]}],
+    largest first.
+    """
+    from bson.objectid import ObjectId
+
+    candidates = _candidate_pairs(max_bucket)
+    involved = sorted({i for pair in candidates for i in pair})
+    signatures = {}
+    for start in range(0, len(involved), 10000):
+        chunk = [ObjectId(i) for i in involved[start:start + 10000]]
+        for doc in papers_col.find({"_id": {"$in": chunk}}, {"minhash": 1}):
+            signatures[str(doc["_id"])] = _decode_signature(doc.get("minhash"))
+
+    edges = []
+    for a, b in candidates:
+        if signatures.get(a) is not None and signatures.get(b) is not None:
+            score = estimated_jaccard(signatures[a], signatures[b])
+            if score >= JACCARD_THRESHOLD:
+                edges.append((a, b, "minhash", round(score, 4)))
+    if use_embeddings:
+        confirmed = {(a, b) for a, b, _, _ in edges}
+        edges += [(a, b, "semantic", round(score, 4)) for (a, b), score in _semantic_pairs().items()
+                  if (a, b) not in confirmed]
+
+    # Union-find over the confirmed pairs
+    parent = {}
+
+    def root(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b, _, _ in edges:
+        parent[root(a)] = root(b)
+    clusters = {}
+    for edge in edges:
+        clusters.setdefault(root(edge[0]), []).append(edge)
+    result = [{"paper_ids": sorted({p for a, b, _, _ in group for p in (a, b)}), "pairs": group}
+              for group in clusters.values()]
+    return sorted(result, key=lambda c: -len(c["paper_ids"]))
+
+
+def print_report(clusters, limit: int = 50):
+    from bson.objectid import ObjectId
+    print(f"{len(clusters)} duplicate groups, {sum(len(c['paper_ids']) for c in clusters)} papers.")
+    for cluster in clusters[:limit]:
+        titles = {str(d["_id"]): d for d in papers_col.find(
+            {"_id": {"$in": [ObjectId(i) for i in cluster["paper_ids"]]}}, {"title": 1, "year": 1})}
+        print("-" * 60)
+        for paper_id in cluster["paper_ids"]:
+            doc = titles.get(paper_id, {})
+            print(f"  {paper_id}  {doc.get('year') or '----'}  {(doc.get('title') or 'Untitled')[:80]}")
+        methods = sorted({method for _, _, method, _ in cluster["pairs"]})
+        print(f"  matched by: {', '.join(methods)}; best score {max(s for *_, s in cluster['pairs']):.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate papers already in the library.")
+    parser.add_argument("--backfill", action="store_true", help="sign papers that have no LSH bands yet")
+    parser.add_argument("--embeddings", action="store_true", help="also compare embeddings (ANN, one query per paper)")
+    parser.add_argument("--max-bucket", type=int, default=MAX_BUCKET)
+    parser.add_argument("--json", help="write the groups to this file")
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(f"Signed {backfill_signatures()} papers.")
+    clusters = find_duplicate_clusters(use_embeddings=args.embeddings, max_bucket=args.max_bucket)
+    print_report(clusters)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(clusters, f, indent=2)
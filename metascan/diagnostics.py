@@ -0,0 +1,92 @@
+"""
+Query planner check for the app's MongoDB query shapes.
+
+    python -m metascan.diagnostics
+
+Runs explain() on one representative query per shape used in
+metascan/search.py, metascan/db.py and metascan/text_index.py and reports
+which ones fall back to a full collection scan (COLLSCAN).
+"""
+from bson.objectid import ObjectId
+from metascan.db import papers_col, users_col, ensure_indexes
+from metascan.search import RESULT_PROJECTION, _literal
+from metascan.text_index import postings_col, terms_col, docs_col
+
+# (name, collection, filter) - values are placeholders; only the shape matters
+QUERY_SHAPES = [
+    ("login: verify_user", users_col, {"username": "someone", "password": "x"}),
+    ("register: create_user", users_col, {"username": "someone"}),
+    ("db.get_papers_by_user", papers_col, {"uploaded_by": "someone"}),
+    ("db.get_paper", papers_col, {"_id": ObjectId()}),
+    ("search.search_by_year", papers_col, {"year": 2020}),
+    ("search.search_by_author", papers_col, {"authors": _literal("smith")}),
+    ("search.search_advanced (year)", papers_col, {"year": 2020}),
+    ("search.search_advanced (author + year)", papers_col, {"authors": _literal("smith"), "year": 2020}),
+    ("search.search_advanced (ranked ids + year)", papers_col, {"_id": {"$in": [ObjectId()]}, "year": 2020}),
+    ("category drilldown", papers_col, {"category": "Cybersecurity"}),
+    ("category + year drilldown", papers_col, {"year": 2020, "category": "Cybersecurity"}),
+    ("text_index: postings by term", postings_col, {"term": {"$in": ["network"]}}),
+    ("text_index: postings by paper", postings_col, {"paper_id": ObjectId()}),
+    ("text_index: document frequency", terms_col, {"_id": {"$in": ["network"]}}),
+    ("text_index: doc length", docs_col, {"_id": ObjectId()}),
+]
+
+
+def _walk_plan(plan):
+    """
+    Yield every stage of a winningPlan tree (top-down).
+    """
+    if not isinstance(plan, dict):
+        return
+    yield plan
+    for key in ("inputStage", "queryPlan"):
+        yield from _walk_plan(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _walk_plan(child)
+
+
+def explain_query_shapes():
+    """
+    Return one report dict per query shape:
+    {"name", "collection", "stages", "indexes", "collscan"}.
+    """
+    report = []
+    for name, col, query in QUERY_SHAPES:
+        projection = RESULT_PROJECTION if col is papers_col else None
+        try:
+            explained = col.find(query, projection).explain()
+        except Exception as e:
+            report.append({"name": name, "collection": col.name, "error": str(e), "collscan": None})
+            continue
+
+        plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+        nodes = list(_walk_plan(plan))
+        stages = [n["stage"] for n in nodes if "stage" in n]
+        indexes = sorted({n["indexName"] for n in nodes if "indexName" in n})
+        report.append({
+            "name": name,
+            "collection": col.name,
+            "stages": stages,
+            "indexes": indexes,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    results = explain_query_shapes()
+    width = max(len(r["name"]) for r in results)
+
+    for r in results:
+        if r.get("error"):
+            status = f"ERROR  {r['error']}"
+        elif r["collscan"]:
+            status = "COLLSCAN  " + " > ".join(r["stages"])
+        else:
+            status = "ok        " + ", ".join(r["indexes"])
+        print(f"{r['name']:<{width}}  [{r['collection']}]  {status}")
+
+    scans = [r["name"] for r in results if r["collscan"]]
+    print()
+    print(f"{len(scans)} of {len(results)} query shapes use a collection scan.")
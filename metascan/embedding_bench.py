@@ -0,0 +1,161 @@
+"""
+Parity check and benchmark for the embedding backends.
+
+    python -m metascan.embedding_bench                       # all backends, sample texts from the library
+    python -m metascan.embedding_bench --backends torch onnx-int8 --limit 500 --threads 4
+
+Every backend embeds the same texts. The report shows, per backend:
+  - parity vs torch: min / mean cosine between the two vectors of each
+    text, and how often the top-10 neighbours of a query agree
+  - latency of single-text calls (search queries) and throughput of
+    batched calls (ingestion)
+  - resident memory added by loading the model
+
+Exits with status 1 if a backend's minimum cosine is below --min-cosine,
+or if a backend fails to load (no silent fallback to torch here).
+"""
+import resource
+import sys
+import time
+import numpy as np
+from metascan import embeddings
+from metascan.embeddings import BACKENDS, DEFAULT_BATCH_SIZE, embedding_text, load_embedding_model
+
+FALLBACK_TEXTS = [
+    "Deep residual learning for image recognition.",
+    "A randomized controlled trial of a new vaccine in elderly patients.",
+    "Detecting phishing websites with gradient boosted trees.",
+    "Gravitational wave signals from binary black hole mergers.",
+    "Economic effects of minimum wage increases on small businesses.",
+    "Soil carbon sequestration under changing rainfall patterns.",
+]
+
+
+def _rss_mb() -> float:
+    # Peak resident set size of this process (KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_texts(limit: int) -> list:
+    """
+    Title + abstract of up to `limit` papers (falls back to a few fixed
+    sentences if the database can't be reached).
+    """
+    try:
+        from metascan.db import iter_papers
+        texts = []
+        for paper in iter_papers(fields=["title", "abstract"]):
+            text = embedding_text(paper.get("title"), paper.get("abstract"))
+            if text:
+                texts.append(text)
+            if len(texts) >= limit:
+                break
+        if texts:
+            return texts
+    except Exception as e:
+        print("Using built-in sample texts:", e)
+    return FALLBACK_TEXTS
+
+
+def _encode(model, texts, batch_size):
+    return np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                                   show_progress_bar=False), dtype=np.float32)
+
+
+def benchmark_backend(backend: str, texts: list, batch_size: int = DEFAULT_BATCH_SIZE, single_calls: int = 50) -> dict:
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = load_embedding_model(backend, fallback=False)
+    load_s = time.perf_counter() - started
+
+    _encode(model, texts[:2], batch_size)  # warm-up (first call allocates)
+
+    started = time.perf_counter()
+    vectors = _encode(model, texts, batch_size)
+    batch_s = time.perf_counter() - started
+
+    singles = texts[:single_calls]
+    latencies = []
+    for text in singles:
+        started = time.perf_counter()
+        model.encode(text, normalize_embeddings=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": backend,
+        "vectors": vectors,
+        "load_s": load_s,
+        "rss_mb": _rss_mb() - rss_before,
+        "texts_per_s": len(texts) / batch_s if batch_s else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def parity(reference: np.ndarray, vectors: np.ndarray, k: int = 10) -> dict:
+    """
+    Cosine between matching rows, and top-k neighbour overlap when each
+    row is used as a query against its own backend's vectors.
+    """
+    cosines = np.sum(reference * vectors, axis=1)
+    k = min(k, len(reference) - 1)
+    overlap = 1.0
+    if k > 0:
+        ref_top = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+        new_top = np.argsort(-(vectors @ vectors.T), axis=1)[:, 1:k + 1]
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, new_top)]))
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean()), "topk_overlap": overlap}
+
+
+def run(backends, texts, batch_size=DEFAULT_BATCH_SIZE, min_cosine=0.99) -> bool:
+    """
+    Benchmark each backend (torch first, as the parity reference).
+    Returns False if any backend fails to load or fails the parity threshold.
+    """
+    backends = ["torch"] + [b for b in backends if b != "torch"]
+    print(f"{len(texts)} texts, batch size {batch_size}, "
+          f"torch threads {embeddings.TORCH_THREADS or 'default'}\n")
+    print(f"{'backend':<10} {'load s':>7} {'+RSS MB':>8} {'texts/s':>8} {'p50 ms':>7} {'p95 ms':>7}"
+          f" {'min cos':>8} {'mean cos':>9} {'top10':>6}")
+
+    ok = True
+    reference = None
+    for backend in backends:
+        try:
+            result = benchmark_backend(backend, texts, batch_size)
+        except Exception as e:
+            if backend == "torch":
+                raise
+            print(f"{backend:<10} failed to load: {e}")
+            ok = False
+            continue
+        if reference is None:
+            reference = result["vectors"]
+        match = parity(reference, result["vectors"])
+        if match["min_cosine"] < min_cosine:
+            ok = False
+        print(f"{backend:<10} {result['load_s']:>7.1f} {result['rss_mb']:>8.0f} {result['texts_per_s']:>8.1f}"
+              f" {result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} {match['min_cosine']:>8.4f}"
+              f" {match['mean_cosine']:>9.4f} {match['topk_overlap']:>6.2f}")
+
+    print("\n+RSS is the growth of the process's peak memory, so later rows only show what they add on top.")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare embedding backends against torch.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--limit", type=int, default=1000, help="number of library papers to embed")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="parity threshold per text")
+    args = parser.parse_args()
+
+    if args.threads:
+        embeddings.TORCH_THREADS = args.threads
+
+    passed = run(args.backends, load_texts(args.limit), args.batch_size, args.min_cosine)
+    sys.exit(0 if passed else 1)
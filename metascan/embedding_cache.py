@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ---------------------------------------------------------
+# EMBEDDING CACHE
+# ---------------------------------------------------------
+# Key = sha256(model name + whitespace-normalised text).
+# Tier 1: in-process LRU (hot search queries).
+# Tier 2: SQLite file on disk (document embeddings, survives restarts).
+
+CACHE_PATH = os.environ.get("METASCAN_EMBEDDING_CACHE", os.path.join("indexes", "embedding_cache.sqlite"))
+MEMORY_SIZE = int(os.environ.get("METASCAN_EMBEDDING_CACHE_SIZE", "4096"))
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_local = threading.local()  # one SQLite connection per thread
+
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+_stats_lock = threading.Lock()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    normalised = " ".join(text.split())
+    return hashlib.sha256(f"{model_name}\0{normalised}".encode("utf-8")).hexdigest()
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def cache_stats() -> dict:
+    """
+    Hit/miss counters since process start, plus the current LRU size.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+    stats["memory_entries"] = len(_memory)
+    return stats
+
+
+# --- Tier 1: memory ---
+def _memory_get(key):
+    with _memory_lock:
+        vector = _memory.get(key)
+        if vector is not None:
+            _memory.move_to_end(key)
+        return vector
+
+
+def _memory_put(key, vector):
+    with _memory_lock:
+        _memory[key] = vector
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+# --- Tier 2: disk ---
+def _disk():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+def _disk_get_many(keys):
+    found = {}
+    try:
+        conn = _disk()
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            for key, blob in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part):
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+    except sqlite3.Error as e:
+        print("Embedding cache read failed:", e)
+    return found
+
+
+def _disk_put_many(items):
+    try:
+        conn = _disk()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+    except sqlite3.Error as e:
+        print("Embedding cache write failed:", e)
+
+
+# --- Public API ---
+def get_cached(keys) -> dict:
+    """
+    Look keys up in memory, then on disk. Returns {key: vector} for hits;
+    disk hits are promoted into the LRU.
+    """
+    found = {}
+    missing = []
+    for key in keys:
+        vector = _memory_get(key)
+        if vector is not None:
+            found[key] = vector
+        else:
+            missing.append(key)
+    _count("memory_hits", len(found))
+
+    if missing:
+        from_disk = _disk_get_many(missing)
+        for key, vector in from_disk.items():
+            _memory_put(key, vector)
+        found.update(from_disk)
+        _count("disk_hits", len(from_disk))
+        _count("misses", len(missing) - len(from_disk))
+    return found
+
+
+def put_cached(items, persist=False):
+    """
+    Store [(key, vector), ...]. persist=True also writes them to disk
+    (use for document embeddings; search queries stay in memory).
+    """
+    items = [(key, vector) for key, vector in items if vector]
+    for key, vector in items:
+        _memory_put(key, vector)
+    if persist and items:
+        _disk_put_many(items)
+        _count("writes", len(items))
+
+
+def clear_memory_cache():
+    with _memory_lock:
+        _memory.clear()
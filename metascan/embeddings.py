@@ -1,23 +1,173 @@
-from sentence_transformers import SentenceTransformer
+import os
+from metascan.embedding_cache import cache_key, get_cached, put_cached
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_BATCH_SIZE = 64
+
+# INFERENCE BACKEND
+#   torch     - PyTorch (default)
+#   onnx      - ONNX Runtime, same weights
+#   onnx-int8 - ONNX Runtime with dynamically quantized int8 weights,
+#               exported once to ONNX_DIR
+# Both ONNX backends need onnxruntime + optimum, installed by the
+# sentence-transformers[onnx] entry in requirements.txt; without them
+# load_embedding_model() falls back to torch.
+# METASCAN_TORCH_THREADS caps intra-op threads (useful with several
+# workers per host); 0 keeps the library default.
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.environ.get("METASCAN_EMBEDDING_BACKEND", "torch")
+TORCH_THREADS = int(os.environ.get("METASCAN_TORCH_THREADS", "0"))
+ONNX_DIR = os.path.join("indexes", "onnx", MODEL_NAME)
+ONNX_QUANTIZATION = os.environ.get("METASCAN_ONNX_QUANTIZATION", "avx2")  # arm64 / avx2 / avx512 / avx512_vnni
+
+
+def _cache_model_id(backend):
+    # int8 vectors differ slightly from the float ones, so they get their
+    # own cache entries; torch and fp32 ONNX produce the same vectors
+    return MODEL_NAME if backend != "onnx-int8" else f"{MODEL_NAME}@int8"
+
+
+CACHE_MODEL_ID = _cache_model_id(EMBEDDING_BACKEND)
 
 # Load once (important for performance)
 _model = None
 
+
+def _load_int8_model():
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(ONNX_DIR, file_name)):
+        print(f"Exporting {MODEL_NAME} to int8 ONNX ({ONNX_QUANTIZATION}) in {ONNX_DIR} ...")
+        model = SentenceTransformer(MODEL_NAME, backend="onnx")
+        model.save(ONNX_DIR)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, ONNX_DIR)
+    return SentenceTransformer(ONNX_DIR, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, fallback: bool = True):
+    """
+    A fresh model for the given backend (get_embedding_model() caches
+    the configured one). Falls back to torch if the backend can't load,
+    unless fallback=False, in which case the error is raised.
+    """
+    # Imported here so modules that only need MODEL_NAME don't pull in torch
+    from sentence_transformers import SentenceTransformer
+
+    if TORCH_THREADS > 0:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+
+    try:
+        if backend == "onnx":
+            return SentenceTransformer(MODEL_NAME, backend="onnx")
+        if backend == "onnx-int8":
+            return _load_int8_model()
+    except Exception as e:
+        if not fallback:
+            raise
+        print(f"Embedding backend {backend} unavailable, using torch:", e)
+    return SentenceTransformer(MODEL_NAME)
+
+
 def get_embedding_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        _model = load_embedding_model(EMBEDDING_BACKEND)
     return _model
 
 
-def generate_embedding(text: str) -> list:
+def embedding_text(title: str, abstract: str) -> str:
+    """
+    The text a paper is embedded from (same recipe everywhere so
+    backfilled and uploaded papers are comparable).
+    """
+    return f"{title or ''} {abstract or ''}".strip()
+
+
+def encode_texts(texts, batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    Raw model call (no cache): one normalised vector per text, in order.
+    Uses the shared model server when METASCAN_MODEL_SERVER is set
+    (falling back to the local model if it can't be reached).
+    """
+    if not texts:
+        return []
+    from metascan.model_server import remote_encode
+    vectors = remote_encode(texts)
+    if vectors is not None:
+        return vectors
+    return encode_texts_local(texts, batch_size)
+
+
+def encode_texts_local(texts, batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    encode_texts with the in-process model. Texts are sorted by length
+    before batching so each batch pads to roughly the same length.
+    """
+    model = get_embedding_model()
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        encoded = model.encode(
+            [texts[i] for i in batch],
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        for i, vector in zip(batch, encoded):
+            vectors[i] = vector.tolist()
+    return vectors
+
+
+def generate_embedding(text: str, persist: bool = False) -> list:
     """
     Generate a semantic embedding for given text.
+    Repeated texts are served from the embedding cache; persist=True also
+    keeps the result in the on-disk tier (document embeddings).
     """
     if not text or not text.strip():
         return []
 
-    model = get_embedding_model()
-    embedding = model.encode(text, normalize_embeddings=True)
+    key = cache_key(CACHE_MODEL_ID, text)
+    cached = get_cached([key]).get(key)
+    if cached is not None:
+        return list(cached)
+
+    embedding = encode_texts([text])[0]
+
+    put_cached([(key, embedding)], persist=persist)
+    return list(embedding)
+
+
+def generate_embeddings(texts, batch_size: int = DEFAULT_BATCH_SIZE, persist: bool = False) -> list:
+    """
+    Generate embeddings for many texts at once.
+    Returns one list per input text, in input order ([] for empty texts).
+
+    Cached texts are skipped; each distinct uncached text is encoded once.
+    """
+    results = [[] for _ in texts]
+    keys = {i: cache_key(CACHE_MODEL_ID, t) for i, t in enumerate(texts) if t and t.strip()}
+    if not keys:
+        return results
+
+    cached = get_cached(list(set(keys.values())))
+    todo = {}  # key -> first index with that text (duplicates are encoded once)
+    for i, key in keys.items():
+        if key in cached:
+            results[i] = list(cached[key])
+        else:
+            todo.setdefault(key, i)
+
+    vectors = encode_texts([texts[i] for i in todo.values()], batch_size)
+    new_items = list(zip(todo, vectors))
+    put_cached(new_items, persist=persist)
+
+    encoded = dict(new_items)
+    for i, key in keys.items():
+        if not results[i]:
+            results[i] = list(encoded[key])
 
-    return embedding.tolist()
+    return results
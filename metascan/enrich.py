@@ -1,8 +1,10 @@
-import spacy
-from transformers import pipeline
-import subprocess
-import sys
+import hashlib
+import json
+import os
 import re
+import threading
+from collections import OrderedDict
+import numpy as np
 
 
 def clean_text(text):
@@ -24,30 +26,108 @@ def clean_text(text):
     text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
 
     return text
-# 1. SETUP SPACY
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-   import en_core_web_sm
-   nlp = en_core_web_sm.load()
+# 1. SPACY: shared NER pipeline lives in metascan/nlp.py (only pdf_extractor uses it)
 # 2. SETUP AI (Lazy Loading)
+# METASCAN_CLASSIFIER picks the fallback used when the rules are unsure:
+#   "zeroshot"  - distilbart NLI pipeline (one forward pass per label)
+#   "embedding" - cosine similarity to label embeddings, reusing the
+#                 MiniLM model already loaded for semantic search (fast)
+CLASSIFIER = os.environ.get("METASCAN_CLASSIFIER", "zeroshot")
+CLASSIFIER_BATCH_SIZE = 16
+CATEGORY_CACHE_SIZE = 10000
+ZERO_SHOT_MIN_SCORE = 0.3
+EMBEDDING_MIN_SCORE = 0.2
+
 _classifier = None
+_label_vectors = None
+_category_cache = OrderedDict()  # sha256(classifier + text) -> category
+_cache_lock = threading.Lock()
 
 def get_classifier():
     global _classifier
     if _classifier is None:
         print("⏳ Loading AI Model... (One-time delay)")
+        # Imported here: transformers/torch take seconds to import
+        from transformers import pipeline
         _classifier = pipeline("zero-shot-classification", model="valhalla/distilbart-mnli-12-1")
     return _classifier
 
 # 3. FAST DICTIONARY (The "Speed Layer")
-CATEGORY_RULES = {
-    "AI / ML": ["neural", "learning", "gpt", "transformer", "cnn", "model", "ai", "algorithm"],
-    "Biomedical": ["patient", "clinical", "disease", "health", "cancer", "biomedical", "inbre", "protein", "gene"],
-    "Computer Vision": ["image", "detection", "video", "pixel", "segmentation", "object"],
-    "Cybersecurity": ["security", "malware", "attack", "encryption", "network", "phishing"],
-    "Physics": ["quantum", "energy", "laser", "particle", "magnetic", "material", "gravitational", "astro"]
-}
+# {category: [terms]} from a JSON rules file. Terms match whole words
+# (case-insensitive, plural "s"/"es" allowed); "astro*" matches any word
+# starting with "astro"; multi-word terms match across any whitespace.
+RULES_PATH = os.environ.get("METASCAN_CATEGORY_RULES",
+                            os.path.join(os.path.dirname(__file__), "category_rules.json"))
+
+def load_category_rules(path=RULES_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+CATEGORY_RULES = load_category_rules()
+
+class RuleMatcher:
+    """
+    All rule terms compiled into one regex, so the text is scanned once
+    no matter how many terms there are. The matched word is mapped back
+    to its categories with dictionary lookups.
+    """
+    def __init__(self, rules):
+        self.categories = list(rules)
+        self.exact = {}     # term -> {categories}
+        self.prefixes = {}  # prefix -> {categories}
+        for cat, terms in rules.items():
+            for term in terms:
+                term = " ".join(term.lower().split())
+                if not term:
+                    continue
+                target = self.prefixes if term.endswith("*") else self.exact
+                target.setdefault(term.rstrip("*"), set()).add(cat)
+        self._prefix_lengths = sorted({len(p) for p in self.prefixes}, reverse=True)
+
+        def alternation(terms):
+            # Longest first so "neural network" wins over "neural"
+            return "|".join(r"\s+".join(map(re.escape, t.split())) for t in sorted(terms, key=len, reverse=True))
+
+        parts = []
+        if self.exact:
+            parts.append(rf"(?:{alternation(self.exact)})(?:e?s)?")
+        if self.prefixes:
+            parts.append(rf"(?:{alternation(self.prefixes)})\w*")
+        # Lookarounds instead of \b, so terms starting or ending with a
+        # symbol ("c++", ".net") still match as whole words
+        self.pattern = re.compile(rf"(?<!\w)(?:{'|'.join(parts)})(?!\w)", re.IGNORECASE) if parts else None
+
+    def _lookup(self, word):
+        for candidate in (word, word[:-1], word[:-2]):
+            if candidate in self.exact:
+                return candidate, self.exact[candidate]
+        for n in self._prefix_lengths:
+            if word[:n] in self.prefixes:
+                return word[:n], self.prefixes[word[:n]]
+        return None, ()
+
+    def scores(self, text):
+        """
+        {category: number of distinct rule terms found in text}
+        """
+        hits = {}
+        if self.pattern is not None and text:
+            for match in self.pattern.finditer(text):
+                term, cats = self._lookup(" ".join(match.group(0).lower().split()))
+                for cat in cats:
+                    hits.setdefault(cat, set()).add(term)
+        return {cat: len(hits.get(cat, ())) for cat in self.categories}
+
+_rule_matcher = None
+
+def get_rule_matcher():
+    global _rule_matcher
+    if _rule_matcher is None:
+        _rule_matcher = RuleMatcher(CATEGORY_RULES)
+    return _rule_matcher
+
+def category_scores(text):
+    return get_rule_matcher().scores(text)
 
 # 4. SLOW AI LABELS (The "Brain Layer")
 CANDIDATE_LABELS = [
@@ -58,55 +138,155 @@ CANDIDATE_LABELS = [
     "Cybersecurity",
     "Quantum Physics",
     "Economics & Social Science",
-    "Environmental Science"
+    "Environmental Science",
     "Research"
 ]
 
-def assign_category(text):
+def _rule_category(text):
     """
-    Hybrid Approach:
-    1. Try Dictionary (Fast)
-    2. If fails, try AI (Smart)
+    Dictionary category if at least 2 keywords hit, else None.
     """
-    if not text: return "General"
-    
-    # --- STEP 1: Fast Dictionary Check ---
-    text_lower = text.lower()
-    scores = {cat: 0 for cat in CATEGORY_RULES}
-    for cat, keywords in CATEGORY_RULES.items():
-        for kw in keywords:
-            if kw in text_lower:
-                scores[cat] += 1
-    
+    scores = category_scores(text)
+    if not scores:
+        return None
     best_rule = max(scores, key=scores.get)
-    # If we found at least 2 keywords, trust the dictionary (It's fast!)
-    if scores[best_rule] >= 2:
-        return best_rule
+    return best_rule if scores[best_rule] >= 2 else None
 
-    # --- STEP 2: AI Fallback (Slower but Smarter) ---
-    # Only runs if dictionary failed or was unsure
-    try:
-        classifier = get_classifier()
+def _cache_key(text):
+    return hashlib.sha256(f"{CLASSIFIER}\0{text}".encode("utf-8")).hexdigest()
+
+def _zero_shot(texts):
+    # The pipeline batches the (text, label) pairs itself
+    classifier = get_classifier()
+    results = classifier(texts, CANDIDATE_LABELS, batch_size=CLASSIFIER_BATCH_SIZE)
+    if isinstance(results, dict):
+        results = [results]
+    return [r["labels"][0] if r["scores"][0] > ZERO_SHOT_MIN_SCORE else "General" for r in results]
+
+def _get_label_vectors():
+    global _label_vectors
+    if _label_vectors is None:
+        from metascan.embeddings import generate_embeddings
+        prompts = [f"A research paper about {label}." for label in CANDIDATE_LABELS]
+        _label_vectors = np.asarray(generate_embeddings(prompts), dtype=np.float32)
+    return _label_vectors
+
+def _embedding_similarity(texts):
+    from metascan.embeddings import generate_embeddings
+    labels = _get_label_vectors()
+    vectors = np.asarray(generate_embeddings(texts, batch_size=CLASSIFIER_BATCH_SIZE * 4), dtype=np.float32)
+    scores = vectors @ labels.T  # both sides are L2-normalised
+    best = scores.argmax(axis=1)
+    return [CANDIDATE_LABELS[j] if scores[i, j] >= EMBEDDING_MIN_SCORE else "General"
+            for i, j in enumerate(best)]
+
+def classify_local(texts):
+    """
+    Model step only (no rules, no cache), with the in-process model.
+    """
+    return _embedding_similarity(texts) if CLASSIFIER == "embedding" else _zero_shot(texts)
+
+def assign_categories(texts):
+    """
+    Batch version of assign_category (one result per text, same order).
+    Rule hits are free; the rest are looked up in the category cache and
+    only the misses go through the model, in batches.
+    """
+    results = ["General"] * len(texts)
+    todo = {}  # cache key -> indices needing the model
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        rule = _rule_category(text)
+        if rule:
+            results[i] = rule
+            continue
         # Truncate text to 1024 chars to speed up AI
-        result = classifier(text[:1024], CANDIDATE_LABELS)
-        
-        top_category = result['labels'][0]
-        confidence = result['scores'][0]
-        
-        if confidence > 0.3:
-            return top_category
+        key = _cache_key(text[:1024])
+        with _cache_lock:
+            cached = _category_cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            todo.setdefault(key, []).append(i)
+
+    if not todo:
+        return results
+
+    keys = list(todo)
+    batch = [texts[todo[k][0]][:1024] for k in keys]
+    try:
+        from metascan.model_server import remote_classify
+        labels = remote_classify(batch)
+        if labels is None:
+            labels = classify_local(batch)
     except Exception as e:
         print(f"AI Warning: {e}")
-        pass
+        return results
+
+    with _cache_lock:
+        for key, label in zip(keys, labels):
+            _category_cache[key] = label
+            for i in todo[key]:
+                results[i] = label
+        while len(_category_cache) > CATEGORY_CACHE_SIZE:
+            _category_cache.popitem(last=False)
+    return results
 
-    return "General"
+def assign_category(text):
+    """
+    Hybrid Approach:
+    1. Try Dictionary (Fast)
+    2. If fails, try AI (Smart)
+    """
+    return assign_categories([text])[0]
 
 # Helper for other files
 def extract_keywords_tfidf(text, top_n=5):
-    from sklearn.feature_extraction.text import TfidfVectorizer
+    """
+    Keywords for one text. Uses the corpus-level model (keyword_model.py)
+    when it has been fitted; otherwise falls back to a one-document fit.
+    """
+    from metascan.keyword_model import get_keyword_model
     if not text: return []
+    model = get_keyword_model()
+    if model is not None:
+        return model.keywords(text, top_n)
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
     try:
         vectorizer = TfidfVectorizer(stop_words="english", max_features=top_n)
         vectorizer.fit_transform([text])
         return list(vectorizer.get_feature_names_out())
     except: return []
+
+def extract_keywords_batch(texts, top_n=5):
+    """
+    Keywords for many texts. With a fitted corpus model this is a
+    transform-only lookup; otherwise ONE TF-IDF fit over the whole batch,
+    so IDF at least down-weights words common to every document.
+    Returns one list per text ([] for empty text).
+    """
+    from metascan.keyword_model import get_keyword_model
+    model = get_keyword_model()
+    if model is not None:
+        return model.keywords_batch(texts, top_n)
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    results = [[] for _ in texts]
+    rows = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not rows:
+        return results
+    try:
+        vectorizer = TfidfVectorizer(stop_words="english")
+        matrix = vectorizer.fit_transform([texts[i] for i in rows]).tocsr()
+    except ValueError:  # only stop words
+        return results
+
+    vocab = vectorizer.get_feature_names_out()
+    for row, i in enumerate(rows):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        cols, scores = matrix.indices[start:end], matrix.data[start:end]
+        best = cols[scores.argsort()[::-1][:top_n]]
+        results[i] = [str(vocab[c]) for c in best]
+    return results
@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metascan.db import papers_col, fetch_papers_ranked
+from metascan.embeddings import generate_embedding
+from metascan.query_cache import cached_search
+from metascan.search import RESULT_PROJECTION, _advanced_filter, _literal_text_filter, _use_text_index
+from metascan.semantic_search import find_nearest
+from metascan.text_index import text_search
+from metascan.vector_index import get_vector_index, normalise_embedding
+
+# ---------------------------------------------------------
+# HYBRID SEARCH (keyword + vector, fused)
+# ---------------------------------------------------------
+# Both retrievers run at the same time (query embedding in a worker
+# thread while MongoDB resolves the filters and scores BM25), each over
+# only the papers that pass the author/year/category filters, and their
+# rankings are merged:
+#   "rrf"      - reciprocal-rank fusion: sum of 1 / (RRF_K + rank)
+#   "weighted" - each list's scores scaled to [0, 1], then
+#                semantic_weight * vector + (1 - semantic_weight) * keyword
+
+FUSIONS = ("rrf", "weighted")
+RRF_K = 60
+DEFAULT_CANDIDATES = 100  # per retriever, before fusion
+# Filters matching more papers than this are applied after retrieval
+# (over-fetching candidates) instead of shipping every id to both engines
+PUSHDOWN_LIMIT = 50000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+    return _executor
+
+
+def _filter_ids(search_filter):
+    """
+    Ids of the papers passing the filters, or None if there are no
+    filters or too many matches to push down.
+    """
+    if not search_filter:
+        return None
+    ids = []
+    for doc in papers_col.find(search_filter, {"_id": 1}).limit(PUSHDOWN_LIMIT + 1):
+        ids.append(str(doc["_id"]))
+    return ids if len(ids) <= PUSHDOWN_LIMIT else None
+
+
+def _keyword_candidates(query, search_filter, allowed, limit):
+    if _use_text_index(query):
+        return text_search(query, limit=limit, paper_ids=allowed)
+    # Keyword index not built yet: literal match, in storage order
+    cursor = papers_col.find({**search_filter, **_literal_text_filter(query)}, {"_id": 1}).limit(limit)
+    return [(1.0 / (rank + 1), str(doc["_id"])) for rank, doc in enumerate(cursor)]
+
+
+def _vector_candidates(query_embedding, allowed, limit, engine):
+    if not query_embedding:
+        return []
+    if allowed is not None:
+        # Exact scores over just the filtered papers
+        query = normalise_embedding(query_embedding)
+        return get_vector_index().rerank(query, allowed, top_k=limit, min_score=0.0) if query is not None else []
+    return find_nearest(query_embedding, top_k=limit, engine=engine, min_score=0.0)
+
+
+def _scaled(hits):
+    if not hits:
+        return {}
+    scores = [score for score, _ in hits]
+    low, high = min(scores), max(scores)
+    span = (high - low) or 1.0
+    return {paper_id: (score - low) / span if high > low else 1.0 for score, paper_id in hits}
+
+
+def fuse(keyword_hits, vector_hits, fusion="rrf", semantic_weight=0.5):
+    """
+    Merge two [(score, paper_id), ...] rankings into one, best first.
+    Returns [(score, paper_id, sources)] where sources names the
+    retrievers that found the paper.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"Unknown fusion: {fusion!r}")
+
+    weights = {"keyword": 1.0 - semantic_weight, "semantic": semantic_weight}
+    fused, sources = {}, {}
+    for name, hits in (("keyword", keyword_hits), ("semantic", vector_hits)):
+        if fusion == "rrf":
+            # Equal weights give plain RRF; skewed weights favour one side
+            contributions = {paper_id: 2 * weights[name] / (RRF_K + rank)
+                             for rank, (_, paper_id) in enumerate(hits, start=1)}
+        else:
+            contributions = {paper_id: weights[name] * s for paper_id, s in _scaled(hits).items()}
+        for paper_id, value in contributions.items():
+            fused[paper_id] = fused.get(paper_id, 0.0) + value
+            sources.setdefault(paper_id, []).append(name)
+
+    ranked = sorted(fused.items(), key=lambda kv: -kv[1])
+    return [(score, paper_id, sources[paper_id]) for paper_id, score in ranked]
+
+
+@cached_search("hybrid_search")
+def hybrid_search(query: str, filters=None, top_k: int = 10, fusion: str = "rrf", semantic_weight: float = 0.5,
+                  candidates: int = DEFAULT_CANDIDATES, engine: str = "exact"):
+    """
+    Keyword (BM25) and semantic retrieval in one request.
+    filters: {"author": ..., "year": ..., "category": ...} (all optional).
+    Returns [(score, paper), ...] best first; each paper carries
+    "matched_by" (["keyword"], ["semantic"] or both).
+    """
+    filters = filters or {}
+    search_filter = _advanced_filter(filters.get("author", ""), filters.get("year"), filters.get("category"))
+    query = (query or "").strip()
+    if not query:
+        # Filters only: nothing to rank by
+        if not search_filter:
+            return []
+        return [(0.0, p) for p in papers_col.find(search_filter, RESULT_PROJECTION).limit(top_k)]
+
+    pool = _get_executor()
+    embedding_future = pool.submit(generate_embedding, query)
+    allowed = _filter_ids(search_filter)
+    if allowed is not None and not allowed:
+        embedding_future.cancel()
+        return []
+
+    # Broad filters are applied after retrieval, so fetch more candidates
+    limit = candidates if allowed is not None or not search_filter else candidates * 5
+    keyword_future = pool.submit(_keyword_candidates, query, search_filter, allowed, limit)
+    vector_hits = _vector_candidates(embedding_future.result(), allowed, limit, engine)
+    keyword_hits = keyword_future.result()
+
+    fused = fuse(keyword_hits, vector_hits, fusion, semantic_weight)
+    post_filter = search_filter if allowed is None else None
+
+    results = []
+    position = 0
+    step = max(top_k * 2, 50)
+    while position < len(fused) and len(results) < top_k:
+        chunk = fused[position:position + step]
+        position += len(chunk)
+        matched_by = {paper_id: found_by for _, paper_id, found_by in chunk}
+        for score, paper in fetch_papers_ranked([(s, p) for s, p, _ in chunk], RESULT_PROJECTION, post_filter):
+            paper["matched_by"] = matched_by[str(paper["_id"])]
+            results.append((score, paper))
+            if len(results) == top_k:
+                break
+    return results
@@ -1,63 +1,88 @@
 import pandas as pd
-from metascan.db import add_paper
+from metascan.db import add_papers
 # 👇 UPDATE: Import from the new "enrich.py" file
-from metascan.enrich import extract_keywords_tfidf, assign_category
+from metascan.enrich import extract_keywords_batch, assign_categories
+from metascan.embeddings import generate_embeddings, embedding_text
 
-def import_csv(file_path: str):
+CSV_FIELDS = ["title", "authors", "year", "journal", "abstract", "keywords"]
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _split_list(series: pd.Series) -> list:
+    # "a, b,,c" -> ["a", "b", "c"]
+    return [[x.strip() for x in value.split(",") if x.strip()] for value in series]
+
+
+def prepare_chunk(df: pd.DataFrame, embed: bool = True) -> list:
     """
-    Read a CSV file and insert each row as a paper into MongoDB.
-    Uses 'enrich.py' to generate Category and Keywords.
+    Turn one CSV chunk into paper documents (column-wise, no iterrows).
+    """
+    for col in CSV_FIELDS:
+        if col not in df.columns:
+            df[col] = ""
+    text = {col: df[col].fillna("").astype(str).str.strip() for col in ("title", "journal", "abstract")}
+
+    authors = _split_list(df["authors"].fillna("").astype(str))
+    keywords_csv = _split_list(df["keywords"].fillna("").astype(str))
+    years = pd.to_numeric(df["year"], errors="coerce").fillna(0).astype(int).tolist()
+
+    titles = text["title"].tolist()
+    abstracts = text["abstract"].tolist()
+
+    # 👇 1. KEYWORDS: one TF-IDF fit for the whole chunk
+    extracted = extract_keywords_batch(abstracts)
+
+    # 👇 2. CATEGORY CLASSIFIER (AI Brain)
+    # This ensures CSV papers get a category like "Cybersecurity" or "AI"
+    categories = assign_categories([f"{t}. {a}" if a else t for t, a in zip(titles, abstracts)])
+
+    # 👇 3. EMBEDDINGS in batches (CSV papers become searchable by meaning)
+    vectors = [[] for _ in titles]
+    if embed:
+        vectors = generate_embeddings([embedding_text(t, a) for t, a in zip(titles, abstracts)], persist=True)
+
+    papers = []
+    for i, title in enumerate(titles):
+        papers.append({
+            "title": title,
+            "authors": authors[i],
+            "year": years[i],
+            "journal": text["journal"].iat[i],
+            "abstract": abstracts[i],
+            # Merge CSV keywords + NLP keywords
+            "keywords": list(dict.fromkeys(keywords_csv[i] + extracted[i])),
+            "category": categories[i],  # 👈 Added Category
+            "embedding": vectors[i],
+            "file_path": ""             # Empty since it is a CSV entry
+        })
+    return papers
+
+
+def import_csv(file_path: str, chunksize: int = DEFAULT_CHUNK_SIZE, embed: bool = True, progress=None):
+    """
+    Read a CSV file in chunks and insert each row as a paper into MongoDB.
+    Uses 'enrich.py' to generate Category and Keywords, and inserts each
+    chunk with a single insert_many.
     """
 
     try:
-        df = pd.read_csv(file_path)
+        reader = pd.read_csv(file_path, chunksize=chunksize, dtype={"authors": str, "keywords": str})
     except Exception as e:
         return f"Error reading CSV: {e}"
 
     inserted_ids = []
-
-    for _, row in df.iterrows():
-
-        # Convert fields safely to strings
-        title = str(row.get("title", ""))
-        authors = str(row.get("authors", "")).split(",")
-        # Clean up author names (remove extra whitespace)
-        authors = [a.strip() for a in authors if a.strip()]
-        
-        year = row.get("year", 0)
+    while True:
         try:
-            year = int(year)
-        except:
-            year = 0
-
-        journal = str(row.get("journal", ""))
-        abstract = str(row.get("abstract", ""))
-        keywords_csv = str(row.get("keywords", "")).split(",")
-        keywords_csv = [k.strip() for k in keywords_csv if k.strip()]
-
-        # 👇 1. USE NEW KEYWORD EXTRACTOR
-        extracted = extract_keywords_tfidf(abstract)
-        
-        # Merge CSV keywords + NLP keywords
-        final_keywords = list(set(keywords_csv + extracted))
-
-        # 👇 2. USE NEW CATEGORY CLASSIFIER (AI Brain)
-        # This ensures CSV papers get a category like "Cybersecurity" or "AI"
-        category = assign_category(abstract, title)
-
-        paper_data = {
-            "title": title,
-            "authors": authors,
-            "year": year,
-            "journal": journal,
-            "abstract": abstract,
-            "keywords": final_keywords,
-            "category": category, # 👈 Added Category
-            "file_path": ""       # Empty since it is a CSV entry
-        }
-
-        # add_paper will automatically generate the Embedding! 🧠
-        inserted_id = add_paper(paper_data)
-        inserted_ids.append(inserted_id)
+            chunk = next(reader)
+        except StopIteration:
+            break
+        except Exception as e:
+            # Keep what was already imported; report where it stopped
+            print(f"Error reading CSV after {len(inserted_ids)} rows: {e}")
+            break
+
+        inserted_ids.extend(add_papers(prepare_chunk(chunk, embed=embed)))
+        if progress:
+            progress(f"Imported {len(inserted_ids)} rows...")
 
     return inserted_ids
@@ -0,0 +1,209 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, ASCENDING
+from pymongo.errors import DuplicateKeyError
+from metascan.db import db, papers_col, add_paper
+from metascan.storage import save_pdf_permanently, file_sha256
+
+# ---------------------------------------------------------
+# INGESTION JOB QUEUE (MongoDB)
+# ---------------------------------------------------------
+# One job per distinct PDF (the job _id is the file's SHA-256), so
+# re-running the upload page, or uploading the same file twice, never
+# creates a second job or a second paper.
+#
+#   queued -> running -> done | failed
+#
+# Workers: python -m metascan.worker (or the in-app worker thread).
+
+jobs_col = db["ingest_jobs"]
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+MAX_ATTEMPTS = 3
+
+_indexes_ready = False
+
+
+def ensure_job_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    jobs_col.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    jobs_col.create_index([("uploaded_by", ASCENDING), ("created_at", ASCENDING)])
+    _indexes_ready = True
+
+
+def enqueue_pdf(uploaded_file, uploaded_by: str = "Unknown", filename: str = "") -> dict:
+    """
+    Queue a PDF for ingestion. Returns the job document; if this exact
+    file was already queued (or ingested) the existing job is returned
+    and nothing is written, unless that job failed or its paper has since
+    been deleted, in which case it is queued again.
+    """
+    ensure_job_indexes()
+    job_id = file_sha256(uploaded_file.getbuffer())
+
+    existing = jobs_col.find_one({"_id": job_id})
+    if existing:
+        if _needs_retry(existing):
+            return _requeue(existing, uploaded_file)
+        return existing
+
+    now = datetime.utcnow()
+    job = {
+        "_id": job_id,
+        "status": QUEUED,
+        "filename": filename or getattr(uploaded_file, "name", ""),
+        "file_path": save_pdf_permanently(uploaded_file),
+        "uploaded_by": uploaded_by,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        jobs_col.insert_one(job)
+    except DuplicateKeyError:
+        # Another rerun/process queued it first; drop our copy of the file
+        os.remove(job["file_path"])
+        return jobs_col.find_one({"_id": job_id})
+    return job
+
+
+def _needs_retry(job) -> bool:
+    if job["status"] == FAILED:
+        return True
+    if job["status"] == DONE and job.get("paper_id"):
+        from bson.objectid import ObjectId
+        return papers_col.find_one({"_id": ObjectId(job["paper_id"])}, {"_id": 1}) is None
+    return False
+
+
+def _requeue(job, uploaded_file) -> dict:
+    """
+    Put a failed/orphaned job back in the queue (once, even if several
+    reruns race), re-saving the PDF if deleting the paper removed it.
+    """
+    file_path = job.get("file_path")
+    saved = None
+    if not file_path or not os.path.exists(file_path):
+        file_path = saved = save_pdf_permanently(uploaded_file)
+    requeued = jobs_col.find_one_and_update(
+        {"_id": job["_id"], "status": job["status"], "updated_at": job["updated_at"]},
+        {
+            "$set": {"status": QUEUED, "file_path": file_path, "attempts": 0, "error": None,
+                     "updated_at": datetime.utcnow()},
+            "$unset": {"paper_id": "", "title": "", "category": "", "duplicate_of": ""},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if requeued is None:
+        # Another rerun/process requeued it first
+        if saved:
+            os.remove(saved)
+        return jobs_col.find_one({"_id": job["_id"]})
+    return requeued
+
+
+def claim_next_job(worker_name: str = None):
+    """
+    Atomically move the oldest queued job to "running" and return it
+    (None if the queue is empty).
+    """
+    now = datetime.utcnow()
+    return jobs_col.find_one_and_update(
+        {"status": QUEUED},
+        {
+            "$set": {"status": RUNNING, "worker": worker_name or socket.gethostname(), "started_at": now,
+                     "updated_at": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _finish(job_id, status, **fields):
+    jobs_col.update_one(
+        {"_id": job_id},
+        {"$set": {"status": status, "updated_at": datetime.utcnow(), **fields}}
+    )
+
+
+def requeue_stale_jobs(timeout_minutes: int = 15) -> int:
+    """
+    Put jobs whose worker died mid-run back in the queue (or fail them
+    after MAX_ATTEMPTS).
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=timeout_minutes)
+    stale = {"status": RUNNING, "started_at": {"$lt": cutoff}}
+    failed = jobs_col.update_many({**stale, "attempts": {"$gte": MAX_ATTEMPTS}},
+                                  {"$set": {"status": FAILED, "error": "worker timed out"}})
+    requeued = jobs_col.update_many(stale, {"$set": {"status": QUEUED}})
+    return failed.modified_count + requeued.modified_count
+
+
+def _remove_unused_pdf(file_path, paper_id):
+    from bson.objectid import ObjectId
+    existing = papers_col.find_one({"_id": ObjectId(paper_id)}, {"file_path": 1}) or {}
+    if file_path and existing.get("file_path") != file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            print("Failed to delete duplicate PDF:", e)
+
+
+def process_job(job_id: str) -> dict:
+    """
+    Run the ingestion pipeline for one job. Safe to run twice: the paper
+    is tagged with the job's file hash, so a retry after a crash finds the
+    paper it already inserted instead of adding another.
+    """
+    from metascan.pipeline import build_paper_from_pdf
+
+    job = jobs_col.find_one({"_id": job_id})
+    if job is None:
+        return {"status": FAILED, "error": "job not found"}
+
+    existing = papers_col.find_one({"source_hash": job_id}, {"_id": 1, "title": 1, "category": 1})
+    if existing:
+        result = {"paper_id": str(existing["_id"]), "title": existing.get("title"),
+                  "category": existing.get("category")}
+        _finish(job_id, DONE, **result)
+        return {"status": DONE, **result}
+
+    try:
+        paper = build_paper_from_pdf(job["file_path"], job.get("uploaded_by", "Unknown"))
+        paper["source_hash"] = job_id
+        try:
+            paper_id = add_paper(paper)
+        except DuplicateKeyError:
+            paper_id = str(papers_col.find_one({"source_hash": job_id}, {"_id": 1})["_id"])
+
+        duplicate_of = paper.get("duplicate_of")
+        if duplicate_of and duplicate_of.get("action") in ("skip", "merge"):
+            # Not stored: the existing paper keeps its own PDF
+            _remove_unused_pdf(job["file_path"], paper_id)
+        result = {"paper_id": paper_id, "title": paper["title"], "category": paper["category"],
+                  "duplicate_of": duplicate_of}
+        _finish(job_id, DONE, error=None, **result)
+        return {"status": DONE, **result}
+    except Exception as e:
+        status = FAILED if job.get("attempts", 0) >= MAX_ATTEMPTS else QUEUED
+        _finish(job_id, status, error=str(e))
+        return {"status": status, "error": str(e)}
+
+
+def get_jobs(job_ids) -> list:
+    """
+    Current state of the given jobs, in the order asked for (for polling).
+    """
+    jobs = {j["_id"]: j for j in jobs_col.find({"_id": {"$in": list(job_ids)}})}
+    return [jobs[j] for j in job_ids if j in jobs]
+
+
+def queue_counts() -> dict:
+    counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    for row in jobs_col.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["n"]
+    return counts
@@ -0,0 +1,146 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# ---------------------------------------------------------
+# CORPUS-LEVEL TF-IDF KEYWORD MODEL
+# ---------------------------------------------------------
+# Document frequencies are counted once over the whole library and saved
+# to disk. Extracting keywords for a new paper is then just a term count
+# and a dictionary lookup (no vectorizer fit per paper), and IDF reflects
+# the real corpus instead of a single document.
+#
+#   python -m metascan.keyword_model            # fit over the library
+#   python -m metascan.keyword_model --refresh  # add papers created since
+
+MODEL_PATH = os.path.join("indexes", "keyword_model.json")
+
+# Same tokenisation as sklearn's TfidfVectorizer default
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+_model = None
+_model_lock = threading.Lock()
+_stop_words = None
+
+
+def _get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+        _stop_words = ENGLISH_STOP_WORDS
+    return _stop_words
+
+
+def tokenize(text: str) -> list:
+    if not text:
+        return []
+    stop_words = _get_stop_words()
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in stop_words and not t.isdigit()]
+
+
+class KeywordModel:
+    def __init__(self, df=None, n_docs=0, fitted_until=""):
+        self.df = Counter(df or {})
+        self.n_docs = n_docs
+        self.fitted_until = fitted_until  # newest created_at counted (ISO string)
+
+    def partial_fit(self, texts):
+        """
+        Count more documents into the document frequencies.
+        """
+        for text in texts:
+            terms = set(tokenize(text))
+            if terms:
+                self.df.update(terms)
+                self.n_docs += 1
+        return self
+
+    def idf(self, term: str) -> float:
+        # Smoothed IDF, as in sklearn (unseen terms get the highest weight)
+        return math.log((1 + self.n_docs) / (1 + self.df.get(term, 0))) + 1
+
+    def keywords(self, text: str, top_n: int = 5) -> list:
+        """
+        Top-n terms of one text by tf * corpus idf.
+        """
+        tf = Counter(tokenize(text))
+        if not tf:
+            return []
+        scored = sorted(tf.items(), key=lambda kv: (-kv[1] * self.idf(kv[0]), kv[0]))
+        return [term for term, _ in scored[:top_n]]
+
+    def keywords_batch(self, texts, top_n: int = 5) -> list:
+        return [self.keywords(t, top_n) for t in texts]
+
+    # --- Persistence ---
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"n_docs": self.n_docs, "fitted_until": self.fitted_until, "df": self.df}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["df"], data["n_docs"], data.get("fitted_until", ""))
+
+
+def get_keyword_model():
+    """
+    The saved corpus model, or None if it has never been fitted.
+    """
+    global _model
+    if _model is None and os.path.exists(MODEL_PATH):
+        with _model_lock:
+            if _model is None:
+                try:
+                    _model = KeywordModel.load(MODEL_PATH)
+                except Exception as e:
+                    print("Failed to load keyword model:", e)
+    return _model
+
+
+def fit_keyword_model(refresh=False, progress=print):
+    """
+    Fit over every abstract in the library (refresh=True only adds papers
+    created after the last fit) and save the model.
+    """
+    global _model
+    from metascan.db import iter_papers
+
+    model = get_keyword_model() if refresh else None
+    if model is None:
+        model = KeywordModel()
+
+    query = {"created_at": {"$gt": model.fitted_until}} if model.fitted_until else None
+    texts = []
+    for paper in iter_papers(fields=["abstract", "created_at"], query=query, batch_size=2000):
+        texts.append(paper.get("abstract") or "")
+        model.fitted_until = max(model.fitted_until, paper.get("created_at") or "")
+        if len(texts) >= 5000:
+            model.partial_fit(texts)
+            texts = []
+            if progress:
+                progress(f"Counted {model.n_docs} documents...")
+    model.partial_fit(texts)
+
+    model.save(MODEL_PATH)
+    with _model_lock:
+        _model = model
+    return model
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit the corpus-level TF-IDF keyword model.")
+    parser.add_argument("--refresh", action="store_true", help="only add papers created since the last fit")
+    args = parser.parse_args()
+
+    model = fit_keyword_model(refresh=args.refresh)
+    print(f"Done: {model.n_docs} documents, {len(model.df)} terms -> {MODEL_PATH}")
@@ -0,0 +1,65 @@
+"""
+Convert stored embeddings to the packed Binary format.
+
+    python -m metascan.migrate_embeddings                  # legacy float lists -> METASCAN_EMBEDDING_DTYPE
+    python -m metascan.migrate_embeddings --dtype float16  # also re-pack existing blobs as float16
+
+Runs in _id order with bulk_write per chunk, so it can be interrupted
+and re-run safely.
+"""
+from pymongo import UpdateOne
+from metascan import db
+from metascan.embeddings import MODEL_NAME
+from metascan.vector_codec import encode_embedding, decode_embedding, embedding_header, is_packed
+
+LEGACY_EMBEDDING = {"embedding.0": {"$exists": True}}  # only matches BSON arrays
+PACKED_EMBEDDING = {"embedding": {"$type": "binData"}}
+
+
+def migrate_embeddings(dtype=None, repack=False, chunk_size=1000, progress=print):
+    """
+    Pack legacy list embeddings (and, with repack=True, blobs stored with a
+    different dtype). Returns the number of documents rewritten.
+    """
+    dtype = dtype or db.EMBEDDING_DTYPE
+    query = {"$or": [LEGACY_EMBEDDING, PACKED_EMBEDDING]} if repack else LEGACY_EMBEDDING
+    rewritten = 0
+    last_id = None
+
+    while True:
+        page_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        chunk = list(db.papers_col.find(page_query, {"embedding": 1}).sort("_id", 1).limit(chunk_size))
+        if not chunk:
+            break
+        last_id = chunk[-1]["_id"]
+
+        ops = []
+        for paper in chunk:
+            stored = paper["embedding"]
+            if is_packed(stored) and embedding_header(stored)["dtype"] == dtype:
+                continue
+            vector = decode_embedding(stored, as_array=True)
+            packed = encode_embedding(vector, dtype=dtype, model=MODEL_NAME)
+            ops.append(UpdateOne({"_id": paper["_id"]}, {"$set": {"embedding": packed}}))
+
+        if ops:
+            db.papers_col.bulk_write(ops, ordered=False)
+            rewritten += len(ops)
+        if progress:
+            progress(f"Rewrote {rewritten} embeddings so far...")
+
+    return rewritten
+
+
+if __name__ == "__main__":
+    import argparse
+    from metascan.vector_codec import DTYPES
+
+    parser = argparse.ArgumentParser(description="Pack stored embeddings as Binary blobs.")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), default=None,
+                        help="target dtype (default: METASCAN_EMBEDDING_DTYPE or float32)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    count = migrate_embeddings(dtype=args.dtype, repack=args.dtype is not None, chunk_size=args.chunk_size)
+    print(f"Done: {count} embeddings rewritten.")
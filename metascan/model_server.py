@@ -0,0 +1,200 @@
+"""
+Shared model server.
+
+One process on the box holds the embedding model and the category
+classifier; every app replica and worker sends it texts over HTTP on
+localhost instead of loading its own copies:
+
+    python -m metascan.model_server --port 8765
+    METASCAN_MODEL_SERVER=http://127.0.0.1:8765 streamlit run app.py
+
+Requests that arrive close together are merged into one model call
+(micro-batching), so concurrent users share forward passes. Clients keep
+their own caches and rule fast path and only send what needs a model;
+if the server can't be reached they fall back to the local model.
+
+    POST /embed     {"texts": [...]}  -> {"vectors": [[...], ...]}
+    POST /classify  {"texts": [...]}  -> {"categories": [...]}
+    GET  /health
+"""
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_SERVER = os.environ.get("METASCAN_MODEL_SERVER", "").rstrip("/")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+REQUEST_TIMEOUT = 120
+RETRY_AFTER = 30  # seconds to use the local model after a failed request
+
+MAX_BATCH = 64
+MAX_WAIT_MS = 10
+
+_down_until = 0.0
+
+
+# ---------------------------------------------------------
+# CLIENT SIDE
+# ---------------------------------------------------------
+def _post(path: str, payload: dict):
+    """
+    POST to the model server. Returns the decoded reply, or None when no
+    server is configured or it is unreachable (callers then run locally).
+    """
+    global _down_until
+    if not MODEL_SERVER or time.time() < _down_until:
+        return None
+    request = urllib.request.Request(
+        MODEL_SERVER + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read())
+    except Exception as e:
+        print(f"Model server unavailable ({e}); using the local model for {RETRY_AFTER}s.")
+        _down_until = time.time() + RETRY_AFTER
+        return None
+
+
+def remote_encode(texts):
+    reply = _post("/embed", {"texts": list(texts)})
+    return reply["vectors"] if reply else None
+
+
+def remote_classify(texts):
+    reply = _post("/classify", {"texts": list(texts)})
+    return reply["categories"] if reply else None
+
+
+# ---------------------------------------------------------
+# SERVER SIDE
+# ---------------------------------------------------------
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests and runs `fn` once for all
+    of them: a batch is sent when it reaches max_batch texts or when the
+    oldest waiting request has waited max_wait_ms.
+    """
+    def __init__(self, fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, texts) -> list:
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.time() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for item, _ in pending for t in item]
+            try:
+                results = self.fn(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for item, future in pending:
+                future.set_result(results[start:start + len(item)])
+                start += len(item)
+
+
+_batchers = {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        batcher = _batchers.get(self.path)
+        if batcher is None:
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length))["texts"]
+            results = batcher.submit(texts)
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        key = "vectors" if self.path == "/embed" else "categories"
+        self._reply(200, {key: results})
+
+    def log_message(self, format, *args):
+        pass  # one line per request is too noisy
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, warm_up=True):
+    """
+    Load the models and serve until interrupted.
+    """
+    import metascan.model_server as client
+    from metascan.embeddings import encode_texts_local, get_embedding_model
+    from metascan.enrich import classify_local, get_classifier, CLASSIFIER
+
+    # This process is the server: its own model calls always run locally
+    # (also when started with python -m, where this module is __main__)
+    client.MODEL_SERVER = ""
+
+    if warm_up:
+        print("Loading models...")
+        get_embedding_model()
+        if CLASSIFIER != "embedding":
+            get_classifier()
+
+    _batchers["/embed"] = MicroBatcher(encode_texts_local)
+    _batchers["/classify"] = MicroBatcher(classify_local, max_batch=16)
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    print(f"Model server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the embedding model and category classifier.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="keep the default: the server has no auth")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--no-warmup", action="store_true", help="load models on the first request instead")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, warm_up=not args.no_warmup)
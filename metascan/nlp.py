@@ -0,0 +1,83 @@
+import os
+import re
+import threading
+
+# ---------------------------------------------------------
+# SHARED spaCy PIPELINE
+# ---------------------------------------------------------
+# One lazily loaded pipeline per process, shared by every module. Only
+# NER is used (author detection), so the tagger, parser and lemmatizer
+# are never loaded. METASCAN_NER=0 skips spaCy entirely and author
+# detection falls back to the regex below.
+
+SPACY_MODEL = "en_core_web_sm"
+USE_NER = os.environ.get("METASCAN_NER", "1") != "0"
+UNUSED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+PIPE_BATCH_SIZE = 64
+
+_nlp = None
+_nlp_failed = False
+_nlp_lock = threading.Lock()
+
+
+def _load():
+    import spacy
+    try:
+        nlp = spacy.load(SPACY_MODEL, exclude=UNUSED_COMPONENTS)
+    except OSError:
+        import en_core_web_sm
+        nlp = en_core_web_sm.load(exclude=UNUSED_COMPONENTS)
+
+    # The shared tok2vec is only needed if NER listens to it (it doesn't
+    # in the small English model, which gives NER its own embedding layer)
+    if "tok2vec" in nlp.pipe_names and not getattr(nlp.get_pipe("tok2vec"), "listening_components", True):
+        nlp.remove_pipe("tok2vec")
+    return nlp
+
+
+def get_nlp():
+    """
+    The shared NER pipeline, or None if NER is switched off or the model
+    can't be loaded.
+    """
+    global _nlp, _nlp_failed
+    if not USE_NER or _nlp_failed:
+        return None
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None and not _nlp_failed:
+                try:
+                    _nlp = _load()
+                except Exception as e:
+                    print("spaCy unavailable, using regex author detection:", e)
+                    _nlp_failed = True
+    return _nlp
+
+
+def _regex_names(text):
+    names = re.findall(r"\b[A-Z][a-z]*\.?\s[A-Z][a-z]+\b", text)
+    return [n for n in names if "Manuscript" not in n and "Published" not in n]
+
+
+def person_names(texts, batch_size=PIPE_BATCH_SIZE, use_ner=True):
+    """
+    Multi-word PERSON entities for each text (one list per text, same
+    order), run through nlp.pipe in batches. Texts where NER finds no one
+    (or use_ner=False / NER off) get the regex fallback.
+    """
+    nlp = get_nlp() if use_ner else None
+    docs = nlp.pipe(texts, batch_size=batch_size) if nlp is not None else [None] * len(texts)
+
+    results = []
+    for text, doc in zip(texts, docs):
+        names = []
+        if doc is not None:
+            for ent in doc.ents:
+                if ent.label_ == "PERSON" and len(ent.text.split()) > 1:
+                    name = ent.text.strip()
+                    if "manuscript" not in name.lower():
+                        names.append(name)
+        if not names:
+            names = _regex_names(text)
+        results.append(list(set(names)))
+    return results
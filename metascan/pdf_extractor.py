@@ -1,25 +1,50 @@
 import fitz  # PyMuPDF
+import os
 import re
-import spacy
 # 1. We import the Category Logic here
 from metascan.enrich import extract_keywords_tfidf, assign_category,clean_text
+# 2. Shared spaCy pipeline (NER only, loaded on first use)
+from metascan.nlp import person_names
 
-# Load spaCy safely
-try:
-    nlp = spacy.load("en_core_web_sm")
-except Exception:
-    nlp = None
+# ---------------------------------------------------------
+# 0. OPENING (path, bytes or stream) + PAGE BUDGET
+# ---------------------------------------------------------
+# Title/authors/abstract all live on the first pages, so only MAX_PAGES
+# are read. Image blocks are left out of the text dict (the default dict
+# flags keep them, with their pixel data, which is the big memory cost).
+MAX_PAGES = int(os.environ.get("METASCAN_PDF_MAX_PAGES", "2"))
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+def open_pdf(source):
+    """
+    Open a PDF from a file path, raw bytes, a Streamlit upload
+    (getbuffer()) or any binary stream (read()).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    if hasattr(source, "getbuffer"):
+        data = source.getbuffer()
+    elif hasattr(source, "read"):
+        data = source.read()
+    else:
+        data = source
+    return fitz.open(stream=bytes(data), filetype="pdf")
+
+def _source_name(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(os.fspath(source))
+    return os.path.basename(getattr(source, "name", "") or "")
 
 # ---------------------------------------------------------
 # 1. HELPER: Extract Layout Blocks
 # ---------------------------------------------------------
-def extract_layout_blocks(file_path):
-    doc = fitz.open(file_path)
+def extract_layout_blocks(doc, max_pages=MAX_PAGES):
+    """
+    Text spans of the first max_pages pages of an open document.
+    """
     blocks = []
-    # Check first 2 pages max
-    for i, page in enumerate(doc):
-        if i > 1: break
-        raw_blocks = page.get_text("dict")["blocks"]
+    for i in range(min(max_pages, doc.page_count)):
+        raw_blocks = doc.load_page(i).get_text("dict", flags=TEXT_FLAGS)["blocks"]
         for b in raw_blocks:
             if "lines" in b:
                 for line in b["lines"]:
@@ -30,27 +55,25 @@ def extract_layout_blocks(file_path):
                             "y": span["bbox"][1],
                             "x": span["bbox"][0]
                         })
-    doc.close()
     return blocks
 
 # ---------------------------------------------------------
 # 2. TITLE DETECTION (Metadata + Visual Fallback)
 # ---------------------------------------------------------
-def detect_title_metadata(file_path):
+def detect_title_metadata(doc):
     """
     Tweak: Check internal PDF metadata first!
     """
     try:
-        with fitz.open(file_path) as doc:
-            meta_title = doc.metadata.get("title", "").strip()
-            
-            # Filter out bad/generic titles
-            if not meta_title: return None
-            if len(meta_title) < 5: return None
-            if "microsoft word" in meta_title.lower(): return None
-            if "untitled" in meta_title.lower(): return None
-            
-            return meta_title
+        meta_title = ((doc.metadata or {}).get("title") or "").strip()
+
+        # Filter out bad/generic titles
+        if not meta_title: return None
+        if len(meta_title) < 5: return None
+        if "microsoft word" in meta_title.lower(): return None
+        if "untitled" in meta_title.lower(): return None
+
+        return meta_title
     except:
         return None
 
@@ -75,7 +98,10 @@ def detect_title_visual(blocks):
 # ---------------------------------------------------------
 # 3. AUTHOR DETECTION (Positional Strategy)
 # ---------------------------------------------------------
-def detect_authors(blocks, title_bottom_y):
+def author_text(blocks, title_bottom_y):
+    """
+    The cleaned text under the title where the author names should be.
+    """
     # If title_bottom_y is 0 (metadata title), scan top 250px
     start_y = title_bottom_y if title_bottom_y > 0 else 0
     end_y = start_y + 250
@@ -88,55 +114,48 @@ def detect_authors(blocks, title_bottom_y):
     ]
     candidates.sort(key=lambda b: (b["y"], b["x"]))
     
-    author_text = " ".join([b["text"] for b in candidates])
+    text = " ".join([b["text"] for b in candidates])
     
     # --- CLEANING ---
-    author_text = re.sub(r"\S+@\S+", "", author_text)
+    text = re.sub(r"\S+@\S+", "", text)
     
     # Remove academic junk words (Including 'Manuscript', 'Published')
     junk_pattern = r"\b(University|Dept|Department|School|Institute|Received|Accepted|Abstract|Correspondence|Author|Public Access)\b.*"
-    author_text = re.sub(junk_pattern, "", author_text, flags=re.IGNORECASE)
-
-    authors = []
-    # 1. spaCy Detection
-    if nlp:
-        doc = nlp(author_text)
-        for ent in doc.ents:
-            if ent.label_ == "PERSON" and len(ent.text.split()) > 1:
-                name = ent.text.strip()
-                if "manuscript" not in name.lower():
-                    authors.append(name)
-    
-    # 2. Regex Fallback
-    if not authors:
-        regex_names = re.findall(r"\b[A-Z][a-z]*\.?\s[A-Z][a-z]+\b", author_text)
-        authors = [n for n in regex_names if "Manuscript" not in n and "Published" not in n]
+    return re.sub(junk_pattern, "", text, flags=re.IGNORECASE)
 
-    return list(set(authors))
+def detect_authors(blocks, title_bottom_y, use_ner=True):
+    # 1. spaCy Detection, 2. Regex Fallback (see metascan/nlp.py)
+    return person_names([author_text(blocks, title_bottom_y)], use_ner=use_ner)[0]
 
 # ---------------------------------------------------------
 # 4. MAIN ENTRY POINT
 # ---------------------------------------------------------
-def extract_pdf_data_visual(file_path):
+def extract_pdf_data_visual(source, enrich=True, max_pages=MAX_PAGES, filename=None, authors=True):
     """
     Main function used by Upload Page.
+    source: file path, bytes or a file-like upload (opened once).
+    enrich=False skips keywords/category so bulk callers can batch them.
+    authors=False skips name detection and returns the candidate text as
+    "author_text" instead (for batching through person_names).
     """
-    blocks = extract_layout_blocks(file_path)
-    
-    # A. Try Metadata Title
-    title = detect_title_metadata(file_path)
-    title_y = 0 
-    
+    with open_pdf(source) as doc:
+        blocks = extract_layout_blocks(doc, max_pages)
+
+        # A. Try Metadata Title
+        title = detect_title_metadata(doc)
+    title_y = 0
+
     # B. Fallback to Visual Title
     if not title:
         title, title_y = detect_title_visual(blocks)
-    
+
     # C. Last Resort: Filename
     if not title:
-        title = file_path.split("/")[-1].replace(".pdf", "")
+        title = re.sub(r"\.pdf$", "", os.path.basename(filename or "") or _source_name(source), flags=re.IGNORECASE)
 
     # D. Detect Authors
-    authors = detect_authors(blocks, title_y)
+    names_text = author_text(blocks, title_y)
+    names = person_names([names_text])[0] if authors else None
     
     # E. Content
     full_text = " ".join([b["text"] for b in blocks])
@@ -147,23 +166,28 @@ def extract_pdf_data_visual(file_path):
     
     # F. Year
     year = 0
-    year_match = re.findall(r"\b(?:19|20)\d{2}\b", full_text)
-    if year_match:
-        year = max([int(y) for y in year_match if 1990 <= int(y) <= 2026])
+    years = [int(y) for y in re.findall(r"\b(?:19|20)\d{2}\b", full_text) if 1990 <= int(y) <= 2026]
+    if years:
+        year = max(years)
     
     # G. Enrichment (RESTORED!)
-    keywords = extract_keywords_tfidf(abstract)
-    category = assign_category(abstract)  # <--- Calculates "Biomedical"
+    keywords, category = [], None
+    if enrich:
+        keywords = extract_keywords_tfidf(abstract)
+        category = assign_category(abstract)  # <--- Calculates "Biomedical"
 
-    return {
+    result = {
         "title": title,
-        "authors": authors,
+        "authors": names,
         "abstract": abstract,
         "year": year,
         "keywords": keywords,
         "category": category, # <--- Returns it to the app
         "full_text": full_text
     }
+    if not authors:
+        result["author_text"] = names_text
+    return result
 
 def extract_arxiv_id(text):
     match = re.search(r"arxiv:\s*(\d+\.\d+)", text, re.IGNORECASE)
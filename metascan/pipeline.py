@@ -0,0 +1,53 @@
+from metascan.pdf_extractor import extract_pdf_data_visual, extract_arxiv_id
+from metascan.arxiv_metadata import fetch_arxiv_metadata
+from metascan.embeddings import generate_embedding, embedding_text
+
+# ---------------------------------------------------------
+# PDF -> PAPER DOCUMENT
+# ---------------------------------------------------------
+# The full ingestion recipe for one stored PDF, shared by the upload page,
+# the job queue workers and bulk ingestion:
+#   layout extraction -> NER / keywords / category -> arXiv authority
+#   -> embedding
+
+
+def merge_arxiv_metadata(extracted: dict) -> dict:
+    """
+    If the text carries an arXiv id, let arXiv's metadata win over the
+    visual heuristics. Returns the merged title/authors/year/journal.
+    """
+    arxiv_id = extract_arxiv_id(extracted["full_text"])
+    meta = fetch_arxiv_metadata(arxiv_id) if arxiv_id else {}
+
+    return {
+        "title": meta.get("title") or extracted["title"],
+        "authors": meta.get("authors") or extracted["authors"],
+        "year": meta.get("year") or extracted["year"],
+        "journal": meta.get("journal") or "Unknown",
+        "arxiv_id": arxiv_id,
+    }
+
+
+def build_paper_from_pdf(pdf_path: str, uploaded_by: str = "Unknown") -> dict:
+    """
+    Run the whole pipeline on a saved PDF and return the document to
+    insert (not inserted here).
+    """
+    extracted = extract_pdf_data_visual(pdf_path)
+    merged = merge_arxiv_metadata(extracted)
+
+    vector = generate_embedding(embedding_text(merged["title"], extracted["abstract"]), persist=True)
+
+    return {
+        "title": merged["title"],
+        "authors": merged["authors"],
+        "year": merged["year"],
+        "journal": merged["journal"],
+        "abstract": extracted["abstract"],
+        "keywords": extracted["keywords"],
+        "tags": extracted["keywords"],
+        "category": extracted.get("category", "General"),
+        "file_path": pdf_path,
+        "embedding": vector,
+        "uploaded_by": uploaded_by,
+    }
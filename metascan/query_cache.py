@@ -0,0 +1,168 @@
+import copy
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from pymongo import ReturnDocument
+
+# ---------------------------------------------------------
+# SEARCH RESULT CACHE
+# ---------------------------------------------------------
+# Shared by every user of this process. Key = search function + its
+# arguments (query text lower-cased and whitespace-normalised). Bounded
+# by size (LRU) and age (TTL).
+#
+# Invalidation: a generation number in MongoDB (app_state "search") is
+# bumped by every paper write in db.py. When a process sees a new
+# generation (checked at most every GENERATION_POLL seconds, or
+# immediately after its own writes) it drops all cached results. A new
+# generation written by another process also forces the vector index to
+# catch up (it otherwise syncs every few seconds), so the first query after
+# a remote write doesn't recompute and cache a stale semantic ranking.
+
+CACHE_SIZE = int(os.environ.get("METASCAN_QUERY_CACHE_SIZE", "1000"))
+CACHE_TTL = float(os.environ.get("METASCAN_QUERY_CACHE_TTL", "300"))
+GENERATION_POLL = 1.0
+
+_cache = OrderedDict()  # key -> (stored_at, result)
+_lock = threading.Lock()
+_generation = None      # generation the cached results belong to
+_checked_at = 0.0
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _state_col():
+    from metascan.db import db
+    return db["app_state"]
+
+
+def _reset_if_changed(generation) -> bool:
+    global _generation
+    changed = generation != _generation and _generation is not None
+    if changed:
+        _cache.clear()
+        _stats["invalidations"] += 1
+    _generation = generation
+    return changed
+
+
+def _catch_up_vector_index():
+    from metascan.vector_index import sync_vector_index
+    try:
+        sync_vector_index()
+    except Exception as e:
+        print("Vector index sync failed:", e)
+
+
+def current_generation():
+    """
+    The write generation, re-read from MongoDB at most every
+    GENERATION_POLL seconds.
+    """
+    global _checked_at
+    now = time.time()
+    if now - _checked_at < GENERATION_POLL and _generation is not None:
+        return _generation
+    try:
+        doc = _state_col().find_one({"_id": "search"}, {"generation": 1}) or {}
+    except Exception as e:
+        print("Search cache generation check failed:", e)
+        return None
+    with _lock:
+        _checked_at = now
+        changed = _reset_if_changed(doc.get("generation", 0))
+    if changed:
+        _catch_up_vector_index()
+    return _generation
+
+
+def bump_generation():
+    """
+    Called after every write that can change search results.
+    """
+    global _checked_at
+    try:
+        doc = _state_col().find_one_and_update(
+            {"_id": "search"}, {"$inc": {"generation": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        print("Search cache invalidation failed:", e)
+        clear()
+        return
+    with _lock:
+        _checked_at = time.time()
+        # Skipping a number means another process wrote in between
+        remote_writes = _generation is not None and doc["generation"] != _generation + 1
+        _reset_if_changed(doc["generation"])
+    if remote_writes:
+        _catch_up_vector_index()
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats, entries=len(_cache), generation=_generation)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def _normalise(name, value, query_args):
+    if isinstance(value, str):
+        value = value.strip()
+        return " ".join(value.lower().split()) if name in query_args else value
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalise(k, v, query_args)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalise(name, v, query_args) for v in value)
+    return value
+
+
+def cached_search(name, query_args=("query",)):
+    """
+    Decorator: cache a search function's results. Arguments listed in
+    query_args are compared case- and whitespace-insensitively; results
+    are deep-copied in and out so callers may modify them.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if CACHE_SIZE <= 0:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name,) + tuple((k, _normalise(k, v, query_args)) for k, v in bound.arguments.items())
+
+            generation = current_generation()
+            now = time.time()
+            with _lock:
+                entry = _cache.get(key)
+                if entry is not None and generation is not None and now - entry[0] < CACHE_TTL:
+                    _cache.move_to_end(key)
+                    _stats["hits"] += 1
+                    return copy.deepcopy(entry[1])
+                _stats["misses"] += 1
+
+            result = fn(*args, **kwargs)
+
+            with _lock:
+                # Only store if no write happened while we were computing
+                if generation is not None and generation == _generation:
+                    _cache[key] = (now, copy.deepcopy(result))
+                    _cache.move_to_end(key)
+                    while len(_cache) > CACHE_SIZE:
+                        _cache.popitem(last=False)
+            return result
+
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
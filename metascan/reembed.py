@@ -0,0 +1,74 @@
+"""
+Bulk (re-)embedding job.
+
+    python -m metascan.reembed            # papers without an embedding
+    python -m metascan.reembed --all      # every paper (e.g. after a model change)
+
+Papers are read in _id order with a projection (title + abstract only),
+embedded in batches and written back with one bulk_write per chunk.
+The job can be stopped and restarted at any time.
+"""
+import threading
+import time
+from metascan.db import papers_col, update_embeddings
+from metascan.embeddings import generate_embeddings, embedding_text, DEFAULT_BATCH_SIZE
+
+MISSING_EMBEDDING = {"$or": [{"embedding": {"$exists": False}}, {"embedding": []}, {"embedding": None}]}
+
+
+def reembed_papers(only_missing=True, chunk_size=1000, batch_size=DEFAULT_BATCH_SIZE, progress=print):
+    """
+    Embed papers chunk by chunk. Returns the number of papers updated.
+    """
+    base_filter = MISSING_EMBEDDING if only_missing else {}
+    total = papers_col.count_documents(base_filter)
+    done = 0
+    last_id = None
+    started = time.time()
+
+    while True:
+        query = dict(base_filter)
+        if last_id is not None:
+            query = {"$and": [base_filter, {"_id": {"$gt": last_id}}]}
+
+        chunk = list(
+            papers_col.find(query, {"title": 1, "abstract": 1})
+            .sort("_id", 1)
+            .limit(chunk_size)
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1]["_id"]
+
+        texts = [embedding_text(p.get("title"), p.get("abstract")) for p in chunk]
+        vectors = generate_embeddings(texts, batch_size=batch_size, persist=True)
+        update_embeddings({str(p["_id"]): v for p, v in zip(chunk, vectors) if v})
+
+        done += len(chunk)
+        if progress:
+            rate = done / max(time.time() - started, 1e-6)
+            progress(f"Embedded {done}/{total} papers ({rate:.0f}/s)")
+
+    return done
+
+
+def start_reembed_in_background(**kwargs) -> threading.Thread:
+    """
+    Run reembed_papers() on a daemon thread (e.g. from the admin UI).
+    """
+    thread = threading.Thread(target=reembed_papers, kwargs=kwargs, daemon=True, name="metascan-reembed")
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill paper embeddings in bulk.")
+    parser.add_argument("--all", action="store_true", help="re-embed every paper, not just missing ones")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="papers read and written per round trip")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="texts per model.encode call")
+    args = parser.parse_args()
+
+    count = reembed_papers(only_missing=not args.all, chunk_size=args.chunk_size, batch_size=args.batch_size)
+    print(f"Done: {count} papers embedded.")
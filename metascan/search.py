@@ -1,18 +1,38 @@
-from metascan.db import papers_col
+import re
 from bson.objectid import ObjectId
+from metascan.db import papers_col, fetch_papers_ranked, paginate_papers
+from metascan.text_index import text_search, tokenize, is_built
+from metascan.query_cache import cached_search
+
+# Search results never need the (large) embedding field
+RESULT_PROJECTION = {"embedding": 0, "minhash": 0, "lsh_bands": 0}
+
+
+def _literal(text: str) -> dict:
+    """
+    Case-insensitive match of the user's text as-is (no regex syntax,
+    so "c++" is a plain string).
+    """
+    return {"$regex": re.escape(text), "$options": "i"}
+
+
+def _literal_text_filter(query: str, fields=("title", "abstract", "keywords")) -> dict:
+    # Fallback used only until the keyword index has been built
+    return {"$or": [{field: _literal(query)} for field in fields]}
+
+
+def _use_text_index(query: str) -> bool:
+    # Queries made only of stop words have no index terms
+    return bool(tokenize(query)) and is_built()
 
 
 def search_by_text(query: str):
     """
-    Basic regex search across title, abstract, and keywords.
+    BM25-ranked keyword search across title, abstract, keywords and authors.
     """
-    return list(papers_col.find({
-        "$or": [
-            {"title": {"$regex": query, "$options": "i"}},
-            {"abstract": {"$regex": query, "$options": "i"}},
-            {"keywords": {"$regex": query, "$options": "i"}}
-        ]
-    }))
+    if not _use_text_index(query):
+        return list(papers_col.find(_literal_text_filter(query), RESULT_PROJECTION))
+    return [paper for _, paper in fetch_papers_ranked(text_search(query))]
 
 
 def search_by_author(author_name: str):
@@ -20,8 +40,8 @@ def search_by_author(author_name: str):
     Search papers by author name.
     """
     return list(papers_col.find({
-        "authors": {"$regex": author_name, "$options": "i"}
-    }))
+        "authors": _literal(author_name)
+    }, RESULT_PROJECTION))
 
 
 def search_by_year(year: int):
@@ -30,37 +50,130 @@ def search_by_year(year: int):
     """
     return list(papers_col.find({
         "year": year
-    }))
+    }, RESULT_PROJECTION))
+
+
+def _advanced_filter(author="", year=None, category=None) -> dict:
+    search_filter = {}
+    if author:
+        search_filter["authors"] = _literal(author)
+    if year:
+        search_filter["year"] = int(year)
+    if category:
+        search_filter["category"] = category
+    return search_filter
 
 
 def search_advanced(query="", author="", year=None):
     """
     Combined search filters.
     Allows searching by:
-    - query text
+    - query text (ranked by BM25 when the keyword index is built)
     - author name
     - year
 
-    This is what Streamlit UI will use.
+    Returns every match; the UI uses search_advanced_page() instead.
     """
 
-    search_filter = {}
+    # Author / year filters
+    search_filter = _advanced_filter(author, year)
+
+    # Text search: rank with the inverted index, then apply the filters
+    # to just the matching ids
+    if query and _use_text_index(query):
+        hits = text_search(query)
+        return [paper for _, paper in fetch_papers_ranked(hits, query=search_filter)]
 
-    # Text search
     if query:
-        search_filter["$or"] = [
-            {"title": {"$regex": query, "$options": "i"}},
-            {"abstract": {"$regex": query, "$options": "i"}},
-            {"keywords": {"$regex": query, "$options": "i"}},
-            {"authors": {"$regex": query, "$options": "i"}}
-        ]
-
-    # Author filter
-    if author:
-        search_filter["authors"] = {"$regex": author, "$options": "i"}
+        search_filter["$or"] = _literal_text_filter(query, ("title", "abstract", "keywords", "authors"))["$or"]
+
+    return list(papers_col.find(search_filter, RESULT_PROJECTION))
+
+
+# ---------------------------------------------------------
+# PAGINATED SEARCH
+# ---------------------------------------------------------
+# Each *_page function returns
+#   {"results": [...], "next_cursor": str or None, "total": int or None}
+# Cursors are opaque strings: "id:<ObjectId>" for filter-only listings
+# (keyset on _id) and "rank:<offset>" for BM25-ranked results. A cursor of
+# the other kind (the keyword index became available between two pages)
+# restarts from the first page.
+
+@cached_search("ranked_hits")
+def _ranked_hits(query: str):
+    # The full BM25 ranking, cached per query and write generation so
+    # "Next" pages only slice it
+    return text_search(query)
+
+
+def _ranked_page(hits, search_filter, limit, offset, with_total):
+    """
+    Walk the ranked hit list from `offset`, keeping hits that pass the
+    filters, until a page is full.
+    """
+    results = []
+    position = offset
+    step = max(limit * 2, 50)
+    while position < len(hits) and len(results) < limit:
+        chunk = hits[position:position + step]
+        matched = {str(p["_id"]): p for _, p in fetch_papers_ranked(chunk, query=search_filter)}
+        for _, paper_id in chunk:
+            position += 1
+            paper = matched.get(str(paper_id))
+            if paper is not None:
+                results.append(paper)
+                if len(results) == limit:
+                    break
+
+    total = None
+    if with_total:
+        total = len(hits) if not search_filter else _count_matching([p for _, p in hits], search_filter)
+
+    return {
+        "results": results,
+        "next_cursor": f"rank:{position}" if position < len(hits) else None,
+        "total": total,
+    }
+
+
+def _count_matching(paper_ids, search_filter, chunk_size=10000):
+    total = 0
+    for start in range(0, len(paper_ids), chunk_size):
+        ids = [ObjectId(p) for p in paper_ids[start:start + chunk_size]]
+        total += papers_col.count_documents({"_id": {"$in": ids}, **search_filter})
+    return total
+
+
+def _keyset_page(search_filter, limit, cursor, with_total):
+    page = paginate_papers(search_filter, limit=limit,
+                           cursor=cursor[3:] if cursor and cursor.startswith("id:") else None,
+                           projection=RESULT_PROJECTION, with_total=with_total)
+    if page["next_cursor"]:
+        page["next_cursor"] = "id:" + page["next_cursor"]
+    return page
+
+
+@cached_search("search_advanced_page")
+def search_advanced_page(query="", author="", year=None, limit: int = 20, cursor: str = None,
+                         with_total: bool = False):
+    """
+    Paginated version of search_advanced() for the UI.
+    """
+    search_filter = _advanced_filter(author, year)
+
+    if query and _use_text_index(query):
+        offset = int(cursor[5:]) if cursor and cursor.startswith("rank:") else 0
+        return _ranked_page(_ranked_hits(query), search_filter, limit, offset, with_total)
+
+    if query:
+        search_filter["$or"] = _literal_text_filter(query, ("title", "abstract", "keywords", "authors"))["$or"]
+    return _keyset_page(search_filter, limit, cursor, with_total)
+
+
+def search_by_author_page(author_name: str, limit: int = 20, cursor: str = None, with_total: bool = False):
+    return _keyset_page({"authors": _literal(author_name)}, limit, cursor, with_total)
 
-    # Year filter
-    if year:
-        search_filter["year"] = int(year)
 
-    return list(papers_col.find(search_filter))
+def search_by_year_page(year: int, limit: int = 20, cursor: str = None, with_total: bool = False):
+    return _keyset_page({"year": year}, limit, cursor, with_total)
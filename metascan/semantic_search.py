@@ -1,6 +1,12 @@
 import numpy as np
-from metascan.db import get_all_papers
 from metascan.embeddings import generate_embedding
+from metascan.db import fetch_papers_ranked
+from metascan.vector_index import get_vector_index
+from metascan.query_cache import cached_search
+
+# "exact" = brute-force scan of the in-memory matrix
+# "ivf"   = approximate IVF index (metascan.ann) + exact rerank
+ENGINES = ("exact", "ivf")
 
 
 def cosine_similarity(a, b):
@@ -11,31 +17,42 @@ def cosine_similarity(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
 
-def semantic_search(query: str, top_k: int = 5):
+def find_nearest(query_embedding, top_k=5, engine="exact", nprobe=None, rerank_k=None, min_score=None):
     """
-    Perform semantic search over stored paper embeddings.
+    Return [(score, paper_id), ...] using the chosen engine.
+    Falls back to exact search when the library is too small for IVF.
     """
-    query_embedding = generate_embedding(query)
-    if not query_embedding:
-        return []
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown search engine: {engine!r}")
 
-    papers = get_all_papers()
-    results = []
+    if engine == "ivf":
+        from metascan.ann import get_ivf_index, DEFAULT_NPROBE
+        ivf = get_ivf_index()
+        if ivf is not None:
+            return ivf.search(query_embedding, top_k=top_k, nprobe=nprobe or DEFAULT_NPROBE,
+                              rerank_k=rerank_k, min_score=min_score)
 
-    for paper in papers:
-        emb = paper.get("embedding", [])
-        if not emb:
-            continue
+    return get_vector_index().search(query_embedding, top_k=top_k, min_score=min_score)
 
-        score = cosine_similarity(query_embedding, emb)
-        results.append((score, paper))
 
-    # Sort by similarity score (descending)
-    results.sort(key=lambda x: x[0], reverse=True)
+@cached_search("semantic_search")
+def semantic_search(query: str, top_k: int = 5, engine: str = "exact", nprobe: int = None, rerank_k: int = None):
+    """
+    Perform semantic search over stored paper embeddings.
+    Returns [(score, paper), ...] sorted by similarity.
 
-    return results[:top_k]
+    engine="ivf" trades a little recall for speed on large libraries;
+    raise nprobe / rerank_k to get closer to exact results.
+    """
+    query_embedding = generate_embedding(query)
+    if not query_embedding:
+        return []
+
+    hits = find_nearest(query_embedding, top_k, engine=engine, nprobe=nprobe, rerank_k=rerank_k)
+    return fetch_papers_ranked(hits)
 
-def search_similar_papers(query: str, top_k: int = 5):
+@cached_search("search_similar_papers")
+def search_similar_papers(query: str, top_k: int = 5, engine: str = "exact", nprobe: int = None):
     """
     Finds papers based on meaning.
     """
@@ -44,24 +61,13 @@ def search_similar_papers(query: str, top_k: int = 5):
     if not query_embedding:
         return []
 
-    # 2. Get all papers from DB
-    papers = get_all_papers()
-    results = []
-
-    # 3. Compare them
-    for paper in papers:
-        emb = paper.get("embedding", [])
-        if not emb: 
-            continue
+    # 2. Top-k lookup in the in-memory index (only positive matches)
+    hits = find_nearest(query_embedding, top_k, engine=engine, nprobe=nprobe, min_score=0.0)
 
-        score = cosine_similarity(query_embedding, emb)
-        
-        # Only keep positive matches
-        if score > 0.0:
-            paper["score"] = score
-            results.append(paper)
-
-    # 4. Sort by highest score
-    results.sort(key=lambda x: x["score"], reverse=True)
+    # 3. Load just those papers, keeping the ranking
+    results = []
+    for score, paper in fetch_papers_ranked(hits):
+        paper["score"] = score
+        results.append(paper)
 
-    return results[:top_k]
+    return results
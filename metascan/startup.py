@@ -0,0 +1,138 @@
+"""
+Cold-start helpers.
+
+Heavy dependencies (torch, transformers, spaCy, the MongoDB connection)
+are all loaded on first use. warm_up() loads them ahead of time in a
+background thread so the first search or upload doesn't pay for it:
+
+    METASCAN_WARMUP=1 streamlit run app.py
+
+Import-time profile (one fresh interpreter per module, via -X importtime):
+
+    python -m metascan.startup --profile
+    python -m metascan.startup --profile metascan.semantic_search --top 30
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+WARMUP_ENABLED = os.environ.get("METASCAN_WARMUP", "0") == "1"
+
+# What each page imports first
+PROFILE_MODULES = [
+    "metascan.db",
+    "metascan.search",
+    "metascan.semantic_search",
+    "metascan.jobs",
+    "metascan.worker",
+    "metascan.pipeline",
+]
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# WARM-UP
+# ---------------------------------------------------------
+def _step(name, fn, log):
+    started = time.time()
+    try:
+        fn()
+        if log:
+            log(f"warm-up: {name} ready in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"warm-up: {name} failed:", e)
+
+
+def warm_up(log=print):
+    """
+    Connect to MongoDB, load the embedding model (unless a model server
+    is configured) and build the vector index.
+    """
+    from metascan.db import get_db, ensure_indexes
+    from metascan.embeddings import get_embedding_model
+    from metascan.model_server import MODEL_SERVER
+    from metascan.vector_index import get_vector_index
+
+    _step("mongodb", lambda: (get_db().command("ping"), ensure_indexes()), log)
+    if not MODEL_SERVER:  # otherwise the model lives in the model server
+        _step("embedding model", get_embedding_model, log)
+    _step("vector index", get_vector_index, log)
+
+
+def start_background_warmup(force=False):
+    """
+    Run warm_up() once per process in a daemon thread (only when
+    METASCAN_WARMUP=1, unless force=True). Returns immediately.
+    """
+    global _warmup_started
+    if not (WARMUP_ENABLED or force):
+        return False
+    with _warmup_lock:
+        if _warmup_started:
+            return False
+        _warmup_started = True
+    threading.Thread(target=warm_up, name="metascan-warmup", daemon=True).start()
+    return True
+
+
+# ---------------------------------------------------------
+# IMPORT-TIME PROFILE
+# ---------------------------------------------------------
+def import_profile(module: str) -> dict:
+    """
+    Import `module` in a fresh interpreter with -X importtime.
+    Returns {"total_ms": ..., "by_package": {top-level package: self ms}}.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+    by_package = defaultdict(float)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        by_package[name.strip().split(".")[0]] += int(self_us) / 1000
+        if name.strip() == module:
+            total_us = int(cumulative_us)
+    return {"total_ms": total_us / 1000, "by_package": dict(by_package)}
+
+
+def print_import_report(modules=None, top: int = 15):
+    for module in modules or PROFILE_MODULES:
+        try:
+            profile = import_profile(module)
+        except Exception as e:
+            print(f"{module}: import failed ({e})\n")
+            continue
+        print(f"{module}: {profile['total_ms']:.0f} ms")
+        heaviest = sorted(profile["by_package"].items(), key=lambda kv: -kv[1])[:top]
+        for package, ms in heaviest:
+            print(f"    {ms:8.1f} ms  {package}")
+        print()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MetaScan cold-start tools.")
+    parser.add_argument("--profile", nargs="*", metavar="MODULE",
+                        help="report import time per package (default: the modules the pages import)")
+    parser.add_argument("--top", type=int, default=15, help="packages to list per module")
+    parser.add_argument("--warm-up", action="store_true", help="run the warm-up steps and report timings")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        print_import_report(args.profile, args.top)
+    if args.warm_up:
+        warm_up()
+    if args.profile is None and not args.warm_up:
+        parser.print_help()
@@ -1,11 +1,21 @@
+import hashlib
 import os
+import shutil
 import uuid
 
 PDF_DIR = os.path.join("uploads", "pdfs")
 
+def file_sha256(data: bytes) -> str:
+    """
+    Content hash of an uploaded file (used to recognise re-uploads).
+    """
+    return hashlib.sha256(data).hexdigest()
+
 def save_pdf_permanently(uploaded_file) -> str:
     """
     Saves uploaded PDF to uploads/pdfs/{uuid}.pdf
+    Accepts a Streamlit upload (anything with getbuffer()), raw bytes,
+    or a path to an existing file (copied, e.g. by bulk ingestion).
     Returns the stored file path.
     """
     os.makedirs(PDF_DIR, exist_ok=True)
@@ -13,7 +23,12 @@ def save_pdf_permanently(uploaded_file) -> str:
     unique_name = f"{uuid.uuid4().hex}.pdf"
     final_path = os.path.join(PDF_DIR, unique_name)
 
+    if isinstance(uploaded_file, (str, os.PathLike)):
+        shutil.copyfile(uploaded_file, final_path)
+        return final_path
+
+    data = uploaded_file if isinstance(uploaded_file, (bytes, bytearray)) else uploaded_file.getbuffer()
     with open(final_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+        f.write(data)
 
     return final_path
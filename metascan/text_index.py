@@ -0,0 +1,351 @@
+import heapq
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+from metascan.db import db, papers_col
+
+# ---------------------------------------------------------
+# KEYWORD SEARCH: INVERTED INDEX + BM25
+# ---------------------------------------------------------
+# The index lives in MongoDB so every app process shares it:
+#   text_postings  {term, paper_id, tf, dl}   one doc per (term, paper)
+#   text_terms     {_id: term, df}            document frequency
+#   text_docs      {_id: paper_id, dl}        one doc per indexed paper
+#   text_stats     {_id: "global", docs, total_len, built_at}
+#
+# add_paper / delete_paper keep it up to date; rebuild_text_index()
+# (python -m metascan.text_index) builds it for an existing library and
+# sets built_at. Papers the write hooks missed (a failed index update, a
+# paper written directly to MongoDB) are picked up by index_missing_papers(),
+# which is_built() runs when the paper and index counts disagree.
+
+postings_col = db["text_postings"]
+terms_col = db["text_terms"]
+docs_col = db["text_docs"]
+stats_col = db["text_stats"]
+
+_indexes_ready = False
+
+# How much a hit in each field counts towards term frequency
+FIELD_WEIGHTS = {"title": 3, "keywords": 2, "authors": 2, "abstract": 1}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Terms matching more papers than this are only scored on papers that
+# rarer query terms already matched; when every query term is that common,
+# only each term's MAX_POSTINGS_SCAN highest-tf postings are scored.
+MAX_POSTINGS_SCAN = 20000
+
+# How often is_built() may look for papers missing from the index, and how
+# old a paper must be before it counts as missed (its insert hook may
+# still be running)
+CATCH_UP_SECONDS = 60
+CATCH_UP_GRACE = timedelta(seconds=60)
+_last_catch_up = 0.0
+
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+[+#]*")
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripping (a cut-down Porter step 1/2) so "networks",
+    "networking" and "network" share a term.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    for suffix, replacement in (("ational", "ate"), ("ization", "ize"), ("fulness", "ful"),
+                                ("iveness", "ive"), ("ousness", "ous")):
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix):
+            root = word[:-len(suffix)]
+            if len(root) >= 3 and re.search(r"[aeiouy]", root):
+                if len(root) > 3 and root[-1] == root[-2] and root[-1] not in "lsz":
+                    root = root[:-1]
+                return root
+    return word
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercase, split into words (keeping "c++" / "c#"), drop stop words, stem.
+    """
+    if not text:
+        return []
+    return [stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def _field_text(value):
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value) if value else ""
+
+
+def paper_terms(paper: dict) -> Counter:
+    """
+    Weighted term frequencies for one paper.
+    """
+    tf = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(_field_text(paper.get(field))):
+            tf[term] += weight
+    return tf
+
+
+# ---------------------------------------------------------
+# INDEX MAINTENANCE
+# ---------------------------------------------------------
+def ensure_text_indexes():
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    postings_col.create_index([("term", ASCENDING), ("paper_id", ASCENDING)], unique=True)
+    postings_col.create_index([("paper_id", ASCENDING)])
+    postings_col.create_index([("term", ASCENDING), ("tf", DESCENDING)])
+    _indexes_ready = True
+
+
+def _write_postings(docs):
+    """
+    docs: [(paper_id, Counter)]. Inserts postings and bumps df / stats.
+    """
+    if not docs:
+        return
+    postings = []
+    df = Counter()
+    total_len = 0
+    for paper_id, tf in docs:
+        dl = sum(tf.values())
+        total_len += dl
+        for term, count in tf.items():
+            postings.append({"term": term, "paper_id": ObjectId(paper_id), "tf": count, "dl": dl})
+            df[term] += 1
+
+    docs_col.insert_many([{"_id": ObjectId(paper_id), "dl": sum(tf.values())} for paper_id, tf in docs],
+                         ordered=False)
+    if postings:
+        postings_col.insert_many(postings, ordered=False)
+        terms_col.bulk_write(
+            [UpdateOne({"_id": term}, {"$inc": {"df": n}}, upsert=True) for term, n in df.items()],
+            ordered=False
+        )
+    stats_col.update_one({"_id": "global"}, {"$inc": {"docs": len(docs), "total_len": total_len}}, upsert=True)
+
+
+def index_paper(paper_id, paper: dict):
+    """
+    Add (or re-add) one paper to the inverted index.
+    """
+    ensure_text_indexes()
+    unindex_paper(paper_id)
+    _write_postings([(paper_id, paper_terms(paper))])
+
+
+def index_new_papers(items):
+    """
+    Batch version of index_paper() for freshly inserted papers
+    ([(paper_id, paper), ...]); skips the per-paper unindex lookup.
+    """
+    ensure_text_indexes()
+    _write_postings([(paper_id, paper_terms(paper)) for paper_id, paper in items])
+
+
+def unindex_paper(paper_id):
+    """
+    Remove a paper's postings and undo its df / length contributions.
+    """
+    doc = docs_col.find_one_and_delete({"_id": ObjectId(paper_id)})
+    if not doc:
+        return
+    terms = postings_col.distinct("term", {"paper_id": ObjectId(paper_id)})
+    if terms:
+        postings_col.delete_many({"paper_id": ObjectId(paper_id)})
+        terms_col.bulk_write([UpdateOne({"_id": t}, {"$inc": {"df": -1}}) for t in terms], ordered=False)
+        terms_col.delete_many({"_id": {"$in": terms}, "df": {"$lte": 0}})
+    stats_col.update_one({"_id": "global"}, {"$inc": {"docs": -1, "total_len": -doc["dl"]}})
+
+
+def rebuild_text_index(batch_size=1000, progress=print):
+    """
+    Drop and rebuild the whole index from the papers collection.
+    """
+    postings_col.drop()
+    terms_col.drop()
+    docs_col.drop()
+    stats_col.drop()
+    ensure_text_indexes()
+    stats_col.insert_one({"_id": "global", "docs": 0, "total_len": 0})
+
+    fields = {f: 1 for f in FIELD_WEIGHTS}
+    batch = []
+    done = 0
+    for paper in papers_col.find({}, fields, batch_size=batch_size):
+        batch.append((str(paper["_id"]), paper_terms(paper)))
+        if len(batch) >= batch_size:
+            _write_postings(batch)
+            done += len(batch)
+            batch = []
+            if progress:
+                progress(f"Indexed {done} papers...")
+    if batch:
+        _write_postings(batch)
+        done += len(batch)
+    stats_col.update_one({"_id": "global"}, {"$set": {"built_at": datetime.utcnow()}})
+    return done
+
+
+def index_missing_papers(batch_size=1000) -> int:
+    """
+    Index papers that have no text_docs entry (older than CATCH_UP_GRACE)
+    and drop index entries of papers that no longer exist.
+    Returns the number of papers indexed.
+    """
+    cutoff = ObjectId.from_datetime(datetime.utcnow() - CATCH_UP_GRACE)
+    fields = {f: 1 for f in FIELD_WEIGHTS}
+    indexed = 0
+
+    ids = [p["_id"] for p in papers_col.find({"_id": {"$lt": cutoff}}, {"_id": 1}, batch_size=batch_size)]
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        have = {d["_id"] for d in docs_col.find({"_id": {"$in": chunk}}, {"_id": 1})}
+        missing = [i for i in chunk if i not in have]
+        if missing:
+            for paper in papers_col.find({"_id": {"$in": missing}}, fields):
+                index_paper(str(paper["_id"]), paper)
+                indexed += 1
+
+    doc_ids = [d["_id"] for d in docs_col.find({"_id": {"$lt": cutoff}}, {"_id": 1}, batch_size=batch_size)]
+    for start in range(0, len(doc_ids), batch_size):
+        chunk = doc_ids[start:start + batch_size]
+        alive = {p["_id"] for p in papers_col.find({"_id": {"$in": chunk}}, {"_id": 1})}
+        for paper_id in chunk:
+            if paper_id not in alive:
+                unindex_paper(paper_id)
+    return indexed
+
+
+def is_built() -> bool:
+    """
+    True once rebuild_text_index() has run on this library. Every
+    CATCH_UP_SECONDS at most, a paper/index count mismatch triggers
+    index_missing_papers().
+    """
+    global _last_catch_up
+    stats = stats_col.find_one({"_id": "global"}, {"built_at": 1})
+    if not stats:
+        return False
+    if not stats.get("built_at"):
+        # Built before the marker existed: trust it if it covers every paper
+        if docs_col.estimated_document_count() < papers_col.estimated_document_count():
+            return False
+        stats_col.update_one({"_id": "global"}, {"$set": {"built_at": datetime.utcnow()}})
+
+    if time.time() - _last_catch_up > CATCH_UP_SECONDS:
+        _last_catch_up = time.time()
+        if docs_col.estimated_document_count() != papers_col.estimated_document_count():
+            try:
+                indexed = index_missing_papers()
+                if indexed:
+                    print(f"Keyword index: caught up {indexed} missed papers")
+            except Exception as e:
+                print("Keyword index catch-up failed:", e)
+    return True
+
+
+# ---------------------------------------------------------
+# QUERYING
+# ---------------------------------------------------------
+def text_search(query: str, limit: int = None, paper_ids=None):
+    """
+    BM25-ranked keyword search. Returns [(score, paper_id), ...] best first.
+    paper_ids (optional) restricts scoring to those papers.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    stats = stats_col.find_one({"_id": "global"}) or {}
+    n_docs = stats.get("docs", 0)
+    if n_docs <= 0:
+        return []
+    avg_len = stats.get("total_len", 0) / n_docs or 1.0
+
+    df = {t["_id"]: t["df"] for t in terms_col.find({"_id": {"$in": terms}})}
+    terms = sorted((t for t in terms if df.get(t, 0) > 0), key=lambda t: df[t])
+    if not terms:
+        return []
+
+    restrict = None if paper_ids is None else [ObjectId(p) for p in paper_ids]
+    rare = [t for t in terms if df[t] <= MAX_POSTINGS_SCAN]
+    common = [t for t in terms if df[t] > MAX_POSTINGS_SCAN]
+
+    scores = Counter()
+    fields = {"_id": 0, "term": 1, "paper_id": 1, "tf": 1, "dl": 1}
+
+    def score_terms(term_list, only_ids, cap=None):
+        if cap:
+            # Highest-tf postings first ({term, tf} index), stop after `cap`
+            cursors = [postings_col.find({"term": t}, fields).sort("tf", DESCENDING).limit(cap) for t in term_list]
+        else:
+            query_filter = {"term": {"$in": term_list}}
+            if only_ids is not None:
+                query_filter["paper_id"] = {"$in": only_ids}
+            cursors = [postings_col.find(query_filter, fields)]
+        for p in (p for cursor in cursors for p in cursor):
+            n = df[p["term"]]
+            idf = math.log(1 + (n_docs - n + 0.5) / (n + 0.5))
+            tf = p["tf"]
+            norm = tf + K1 * (1 - B + B * p["dl"] / avg_len)
+            scores[str(p["paper_id"])] += idf * tf * (K1 + 1) / norm
+
+    if rare and common:
+        score_terms(rare, restrict)
+        candidates = [ObjectId(p) for p in scores]
+        if candidates:
+            score_terms(common, candidates)
+    elif common and restrict is None:
+        score_terms(common, None, cap=MAX_POSTINGS_SCAN)
+    else:
+        score_terms(terms, restrict)
+
+    ranked = ((score, paper_id) for paper_id, score in scores.items())
+    return heapq.nlargest(limit, ranked) if limit else sorted(ranked, reverse=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the BM25 keyword index.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--missing", action="store_true",
+                        help="Only index papers missing from the index (no full rebuild)")
+    args = parser.parse_args()
+
+    if args.missing:
+        count = index_missing_papers(batch_size=args.batch_size)
+    else:
+        count = rebuild_text_index(batch_size=args.batch_size)
+    print(f"Done: {count} papers indexed.")
@@ -0,0 +1,91 @@
+import struct
+import numpy as np
+from bson.binary import Binary
+
+# ---------------------------------------------------------
+# PACKED EMBEDDING FORMAT
+# ---------------------------------------------------------
+# Embeddings are stored in MongoDB as one Binary blob instead of a BSON
+# array of doubles:
+#
+#   magic "MSEV" | version u8 | dtype u8 | dim u16 | scale f32 | model len u8 | model utf-8 | payload
+#
+# dtype float32 is lossless (for normalised vectors), float16 halves it
+# again, int8 quarters it (symmetric quantisation; `scale` restores it).
+
+MAGIC = b"MSEV"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sBBHfB")
+
+DTYPES = {
+    "float32": (1, np.float32),
+    "float16": (2, np.float16),
+    "int8": (3, np.int8),
+}
+_DTYPE_BY_CODE = {code: (name, np_type) for name, (code, np_type) in DTYPES.items()}
+
+
+def encode_embedding(vector, dtype: str = "float32", model: str = "") -> Binary:
+    """
+    Pack an embedding (list or array) into a Binary blob.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype!r}")
+    code, np_type = DTYPES[dtype]
+
+    values = np.asarray(vector, dtype=np.float32).ravel()
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.max(np.abs(values))) if values.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        payload = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+    else:
+        payload = values.astype(np_type)
+
+    model_bytes = model.encode("utf-8")[:255]
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, code, values.size, scale, len(model_bytes))
+    return Binary(header + model_bytes + payload.tobytes())
+
+
+def is_packed(value) -> bool:
+    return isinstance(value, (bytes, bytearray)) and bytes(value[:4]) == MAGIC
+
+
+def embedding_header(value) -> dict:
+    """
+    Read the header of a packed embedding: dtype, dim, scale and model.
+    """
+    magic, version, code, dim, scale, model_len = _HEADER.unpack_from(value)
+    if magic != MAGIC:
+        raise ValueError("Not a packed embedding")
+    model = bytes(value[_HEADER.size:_HEADER.size + model_len]).decode("utf-8")
+    return {
+        "version": version,
+        "dtype": _DTYPE_BY_CODE[code][0],
+        "dim": dim,
+        "scale": scale,
+        "model": model,
+        "offset": _HEADER.size + model_len,
+    }
+
+
+def decode_embedding(value, as_array: bool = False):
+    """
+    Accept whatever is stored in a paper's "embedding" field (packed blob,
+    legacy list of floats, or nothing) and return a float32 array
+    (as_array=True) or a plain list.
+    """
+    if value is None or (not is_packed(value) and len(value) == 0):
+        return np.zeros(0, dtype=np.float32) if as_array else []
+
+    if is_packed(value):
+        header = embedding_header(value)
+        np_type = DTYPES[header["dtype"]][1]
+        array = np.frombuffer(value, dtype=np_type, count=header["dim"], offset=header["offset"])
+        array = array.astype(np.float32)
+        if header["dtype"] == "int8":
+            array *= header["scale"]
+    else:
+        array = np.asarray(value, dtype=np.float32)
+
+    return array if as_array else array.tolist()
@@ -0,0 +1,288 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from metascan.db import papers_col, deleted_col
+from metascan.vector_codec import decode_embedding
+
+# ---------------------------------------------------------
+# PROCESS-WIDE EMBEDDING INDEX
+# ---------------------------------------------------------
+# All paper embeddings live in one contiguous float32 matrix (one row per
+# paper) next to an array of paper ids. It is built once from MongoDB on
+# first use, then kept in sync by add_paper / delete_paper in metascan.db,
+# so a query is a single matrix-vector product instead of a collection scan.
+#
+# Papers written by other processes (ingestion workers, CLI jobs) are picked
+# up by a periodic catch-up query on "embedded_at".
+
+SYNC_SECONDS = 5
+# Re-read a little history on every sync to tolerate clock skew between hosts
+SYNC_OVERLAP = timedelta(seconds=30)
+
+_index = None
+_index_lock = threading.Lock()
+_synced_at = None       # DB time covered so far (datetime)
+_last_sync_check = 0.0  # time.time() of the last catch-up query
+
+
+class EmbeddingIndex:
+    def __init__(self, dim=0, capacity=1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=object)
+        self._rows = {}  # paper_id -> row number
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """Live rows of the embedding matrix (a view, do not modify)."""
+        return self._matrix[:self._size]
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._ids), 1024)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=object)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def add(self, paper_id, embedding):
+        """
+        Insert or replace one paper's embedding.
+        Vectors are L2-normalised so a dot product is the cosine similarity.
+        Returns False if the embedding is empty or has the wrong dimension.
+        """
+        vector = normalise_embedding(embedding)
+        if vector is None:
+            return False
+
+        paper_id = str(paper_id)
+        with self._lock:
+            if self.dim == 0:
+                self.dim = vector.shape[0]
+                self._matrix = np.zeros((len(self._ids), self.dim), dtype=np.float32)
+            if vector.shape[0] != self.dim:
+                return False
+
+            row = self._rows.get(paper_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._ids[row] = paper_id
+                self._rows[paper_id] = row
+            self._matrix[row] = vector
+        return True
+
+    def remove(self, paper_id):
+        """
+        Drop a paper from the index by moving the last row into its slot.
+        """
+        paper_id = str(paper_id)
+        with self._lock:
+            row = self._rows.pop(paper_id, None)
+            if row is None:
+                return False
+
+            last = self._size - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids[last] = None
+            self._size = last
+        return True
+
+    def search(self, query_embedding, top_k=5, min_score=None):
+        """
+        Return [(score, paper_id), ...] for the top_k most similar papers,
+        best first.
+        """
+        query = normalise_embedding(query_embedding)
+        if query is None or top_k <= 0:
+            return []
+
+        with self._lock:
+            if self._size == 0 or query.shape[0] != self.dim:
+                return []
+            scores = self._matrix[:self._size] @ query
+            ids = self._ids[:self._size].copy()
+
+        return _top_k(scores, ids, top_k, min_score)
+
+    def rerank(self, query, paper_ids, top_k=5, min_score=None):
+        """
+        Exact scores for a candidate set (used by the ANN engine).
+        `query` must already be normalised.
+        """
+        found_ids, matrix = self.vectors_for(paper_ids)
+        if not found_ids:
+            return []
+        return _top_k(matrix @ query, np.asarray(found_ids, dtype=object), top_k, min_score)
+
+    def get(self, paper_id):
+        """
+        The stored (normalised) vector of one paper, or None.
+        """
+        with self._lock:
+            row = self._rows.get(str(paper_id))
+            return None if row is None else self._matrix[row].copy()
+
+    def vectors_for(self, paper_ids):
+        """
+        Return (ids, matrix) for the given papers that are in the index
+        (each id once, even if asked for twice).
+        """
+        with self._lock:
+            rows = [(p, self._rows[p]) for p in dict.fromkeys(map(str, paper_ids)) if p in self._rows]
+            if not rows:
+                return [], np.zeros((0, self.dim), dtype=np.float32)
+            matrix = self._matrix[[row for _, row in rows]]
+        return [p for p, _ in rows], matrix
+
+    def snapshot(self, copy=True):
+        """
+        Return (ids, matrix) for every indexed paper.
+        """
+        with self._lock:
+            ids = list(self._ids[:self._size])
+            matrix = self._matrix[:self._size]
+            if copy:
+                matrix = matrix.copy()
+        return ids, matrix
+
+
+def _top_k(scores, ids, top_k, min_score=None):
+    k = min(top_k, scores.shape[0])
+    if k <= 0:
+        return []
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    top = top[np.argsort(-scores[top])]
+
+    results = []
+    for row in top:
+        score = float(scores[row])
+        if min_score is not None and score <= min_score:
+            break
+        results.append((score, ids[row]))
+    return results
+
+
+def normalise_embedding(embedding):
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if vector.size == 0:
+        return None
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+
+def build_index(batch_size=2000):
+    """
+    Load every stored embedding from MongoDB into a fresh EmbeddingIndex.
+    Only _id and embedding are fetched; packed blobs decode straight
+    into NumPy without a Python list in between.
+    """
+    index = EmbeddingIndex()
+    cursor = papers_col.find(
+        {"embedding": {"$exists": True, "$nin": [None, []]}},
+        {"embedding": 1},
+        batch_size=batch_size
+    )
+    for paper in cursor:
+        index.add(paper["_id"], decode_embedding(paper["embedding"], as_array=True))
+    return index
+
+
+def get_vector_index():
+    """
+    Return the process-wide index, building it on first use and catching
+    up with other processes' writes every SYNC_SECONDS.
+    """
+    global _index, _synced_at, _last_sync_check
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _synced_at = datetime.utcnow()
+                _last_sync_check = time.time()
+                _index = build_index()
+    elif time.time() - _last_sync_check > SYNC_SECONDS:
+        sync_vector_index()
+    return _index
+
+
+def sync_vector_index():
+    """
+    Catch up with other processes: add embeddings stored since the last
+    sync and drop papers deleted since then (deleted_papers tombstones).
+    """
+    global _synced_at, _last_sync_check
+    from metascan.ann import ann_index_paper, ann_unindex_paper
+    if _index is None:
+        return  # not built yet: it will load everything when it is
+
+    _last_sync_check = time.time()
+    started = datetime.utcnow()
+    since = (_synced_at or started) - SYNC_OVERLAP
+    cursor = papers_col.find({"embedded_at": {"$gt": since}}, {"embedding": 1})
+    for paper in cursor:
+        paper_id = str(paper["_id"])
+        vector = normalise_embedding(decode_embedding(paper.get("embedding"), as_array=True))
+        if vector is None:
+            continue
+        # The overlap window re-reads recent papers; skip ones already current
+        current = _index.get(paper_id)
+        if current is not None and current.shape == vector.shape and np.allclose(current, vector, atol=1e-6):
+            continue
+        _index.add(paper_id, vector)
+        ann_index_paper(paper_id, vector)
+
+    for doc in deleted_col.find({"deleted_at": {"$gt": since}}, {"_id": 1}):
+        _index.remove(doc["_id"])
+        ann_unindex_paper(str(doc["_id"]))
+    _synced_at = started
+
+
+def rebuild_vector_index():
+    """
+    Throw away the current index and reload it from MongoDB.
+    """
+    global _index, _synced_at
+    with _index_lock:
+        _synced_at = datetime.utcnow()
+        _index = build_index()
+    return _index
+
+
+def index_paper(paper_id, embedding):
+    """
+    Called after an insert. If the index has not been built yet there is
+    nothing to update: the paper will be picked up when it is built.
+    """
+    if _index is not None and embedding is not None and len(embedding) > 0:
+        _index.add(paper_id, embedding)
+
+
+def unindex_paper(paper_id):
+    """
+    Called after a delete.
+    """
+    if _index is not None:
+        _index.remove(paper_id)
@@ -0,0 +1,99 @@
+"""
+Ingestion worker.
+
+    python -m metascan.worker                 # one process per CPU core
+    python -m metascan.worker --processes 4
+
+Claims queued jobs from metascan.jobs and runs them on a process pool
+(PDF parsing, spaCy and the transformer models are CPU-bound, so threads
+would serialise on the GIL). The Streamlit app can also start an
+in-process dispatcher with ensure_background_worker(); it uses a single
+child process (METASCAN_INLINE_WORKER_PROCESSES) since every child loads
+its own copy of the models next to the app's.
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from metascan.jobs import claim_next_job, process_job, requeue_stale_jobs
+
+DEFAULT_PROCESSES = int(os.environ.get("METASCAN_WORKER_PROCESSES", str(os.cpu_count() or 1)))
+INLINE_PROCESSES = int(os.environ.get("METASCAN_INLINE_WORKER_PROCESSES", "1"))
+POLL_SECONDS = 1.0
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def run_worker(processes: int = DEFAULT_PROCESSES, stop_event: threading.Event = None, log=print):
+    """
+    Keep up to `processes` jobs running until stop_event is set.
+    """
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    # "spawn" so child processes don't inherit threads/sockets from the app
+    context = multiprocessing.get_context("spawn")
+    running = {}
+    last_requeue = 0.0
+
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        while stop_event is None or not stop_event.is_set():
+            if time.time() - last_requeue > 60:
+                requeue_stale_jobs()
+                last_requeue = time.time()
+
+            # Fill free slots
+            while len(running) < processes:
+                job = claim_next_job(name)
+                if job is None:
+                    break
+                running[pool.submit(process_job, job["_id"])] = job
+                if log:
+                    log(f"Started {job.get('filename') or job['_id']}")
+
+            if not running:
+                time.sleep(POLL_SECONDS)
+                continue
+
+            finished, _ = wait(list(running), timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"status": "failed", "error": str(e)}
+                if log:
+                    log(f"{job.get('filename') or job['_id']}: {result.get('status')} {result.get('error') or ''}")
+
+
+def ensure_background_worker(processes: int = INLINE_PROCESSES):
+    """
+    Start one dispatcher thread per app process (no-op if already running).
+    Set METASCAN_INLINE_WORKER=0 when dedicated workers are deployed.
+    """
+    global _background
+    if os.environ.get("METASCAN_INLINE_WORKER", "1") == "0":
+        return None
+    with _background_lock:
+        if _background is None or not _background.is_alive():
+            _background = threading.Thread(
+                target=run_worker, kwargs={"processes": processes, "log": None},
+                daemon=True, name="metascan-ingest-worker"
+            )
+            _background.start()
+    return _background
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the PDF ingestion worker pool.")
+    parser.add_argument("--processes", type=int, default=DEFAULT_PROCESSES)
+    args = parser.parse_args()
+
+    print(f"Ingestion worker running with {args.processes} processes. Ctrl+C to stop.")
+    try:
+        run_worker(args.processes)
+    except KeyboardInterrupt:
+        pass
@@ -1,83 +1,92 @@
 import streamlit as st
-from metascan.storage import save_pdf_permanently
-from metascan.db import add_paper
+import pandas as pd
 
-# 1. VISUAL EXTRACTOR
-from metascan.pdf_extractor import extract_pdf_data_visual, extract_arxiv_id
-from metascan.arxiv_metadata import fetch_arxiv_metadata
-
-# 2. VECTOR ENGINE
-# (Make sure this matches your filename: embedding.py or embeddings.py)
-from metascan.embeddings import generate_embedding
+# 1. INGESTION QUEUE
+# Uploads are queued and processed by worker processes, so this page
+# stays responsive and Streamlit reruns never re-process a file.
+from metascan.jobs import enqueue_pdf, get_jobs, queue_counts, DONE, FAILED
+from metascan.worker import ensure_background_worker
 
 st.title("📤 Upload Research Papers")
 
+ensure_background_worker()
+
 # -----------------------------
-# Upload PDF (VISUAL STRATEGY)
+# Upload PDFs (VISUAL STRATEGY)
 # -----------------------------
-st.subheader("Upload PDF File")
-pdf_file = st.file_uploader("Upload PDF", type=["pdf"])
-
-if pdf_file:
-    # 1. Save PDF permanently
-    st.info("Saving PDF permanently...")
-    pdf_path = save_pdf_permanently(pdf_file)
-
-    st.info("Analyzing Layout (Visual Strategy)...")
-    
-    # 2. Run the Visual Extractor
-    # Returns: {'title', 'authors', 'abstract', 'year', 'keywords', 'category', 'full_text'}
-    extracted = extract_pdf_data_visual(pdf_path)
-    
-    # 3. Check for arXiv Authority
-    arxiv_id = extract_arxiv_id(extracted["full_text"])
-    meta = {}
-    if arxiv_id:
-        st.success(f"arXiv ID detected: {arxiv_id}. Fetching authoritative metadata...")
-        meta = fetch_arxiv_metadata(arxiv_id)
-
-    # 4. Merge: Authority > Visual Heuristic
-    final_title = meta.get("title") or extracted["title"]
-    final_authors = meta.get("authors") or extracted["authors"]
-    final_year = meta.get("year") or extracted["year"]
-    final_journal = meta.get("journal") or "Unknown"
-
-    # 5. Generate Vector Embedding
-    st.info("Generating AI Embeddings...")
-    text_to_embed = f"{final_title} {extracted['abstract']}"
-    vector = generate_embedding(text_to_embed)
-
-    # 6. Prepare Data for MongoDB
-    paper_data = {
-        "title": final_title,
-        "authors": final_authors,
-        "year": final_year,
-        "journal": final_journal,
-        "abstract": extracted["abstract"],
-        "keywords": extracted["keywords"], 
-        "tags": extracted["keywords"], 
-        
-        # 👇 THIS WAS MISSING! IT SAVES "Biomedical" / "AI" TO DB
-        "category": extracted.get("category", "General"),
-        
-        "file_path": pdf_path,
-        "embedding": vector,
-        "uploaded_by": st.session_state.get("username", "Unknown")
-    }
-
-    inserted_id = add_paper(paper_data)
-
-    st.success("PDF stored permanently and indexed ✅")
-    
-    # Show the category we found
-    st.info(f"🏷️ Category Assigned: **{paper_data['category']}**")
-
-    st.write("Paper ID:", inserted_id)
-    
-  
-    # Debug info to see what we found
-    with st.expander("See Extracted Metadata"):
-        st.write(f"**Title:** {final_title}")
-        st.write(f"**Authors:** {final_authors}")
-        st.write(f"**Year:** {final_year}")
-        st.write(f"**Abstract Snippet:** {extracted['abstract'][:200]}...")
\ No newline at end of file
+st.subheader("Upload PDF Files")
+pdf_files = st.file_uploader("Upload PDF", type=["pdf"], accept_multiple_files=True)
+
+if "my_jobs" not in st.session_state:
+    st.session_state["my_jobs"] = []
+
+if "enqueued_files" not in st.session_state:
+    st.session_state["enqueued_files"] = set()
+
+for pdf_file in pdf_files or []:
+    # Each upload is enqueued once per session (reruns don't retry a failed
+    # job over and over); uploading the file again retries it
+    upload_id = getattr(pdf_file, "file_id", None) or pdf_file.name
+    if upload_id in st.session_state["enqueued_files"]:
+        continue
+    # Idempotent: the same file always maps to the same job
+    job = enqueue_pdf(pdf_file, uploaded_by=st.session_state.get("username", "Unknown"))
+    st.session_state["enqueued_files"].add(upload_id)
+    if job["_id"] not in st.session_state["my_jobs"]:
+        st.session_state["my_jobs"].append(job["_id"])
+
+# -----------------------------
+# Job Status
+# -----------------------------
+REFRESH_SECONDS = 2
+
+
+def _pending(jobs):
+    return any(j["status"] not in (DONE, FAILED) for j in jobs)
+
+
+if st.session_state["my_jobs"]:
+    st.subheader("Processing Status")
+    polling = _pending(get_jobs(st.session_state["my_jobs"]))
+
+    # Re-runs on its own every REFRESH_SECONDS while jobs are queued/running
+    @st.fragment(run_every=REFRESH_SECONDS if polling else None)
+    def job_status():
+        jobs = get_jobs(st.session_state["my_jobs"])
+        rows = []
+        for job in jobs:
+            duplicate = job.get("duplicate_of") or {}
+            rows.append({
+                "File": job.get("filename", ""),
+                "Status": job["status"],
+                "Title": job.get("title", ""),
+                "Category": job.get("category", ""),
+                "Details": f"/Paper_Details?id={job['paper_id']}" if job.get("paper_id") else "",
+                "Duplicate": (f"{duplicate.get('action', 'flagged')} ({duplicate['method']}, {duplicate['score']:.2f})"
+                              if duplicate else ""),
+                "Error": job.get("error") or "",
+            })
+
+        st.dataframe(
+            pd.DataFrame(rows),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Details": st.column_config.LinkColumn("Details", display_text="📄 View")}
+        )
+
+        done = sum(1 for j in jobs if j["status"] == DONE)
+        failed = sum(1 for j in jobs if j["status"] == FAILED)
+        if done == len(jobs):
+            st.success("All PDFs stored permanently and indexed ✅")
+        elif failed:
+            st.warning(f"{failed} file(s) failed. See the Error column.")
+        else:
+            st.info(f"{done}/{len(jobs)} processed. Updating automatically...")
+
+        counts = queue_counts()
+        st.caption(f"Queue: {counts['queued']} waiting, {counts['running']} running")
+
+        if polling and not _pending(jobs):
+            st.rerun()  # everything finished: full rerun stops the polling
+
+    job_status()
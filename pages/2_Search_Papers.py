@@ -1,6 +1,8 @@
 import streamlit as st
-from metascan.search import search_advanced
+from metascan.search import search_advanced_page
 from metascan.semantic_search import semantic_search,search_similar_papers
+from metascan.hybrid_search import hybrid_search
+from metascan.db import papers_col
 
 
 st.title("🔍 Search Research Papers")
@@ -10,7 +12,7 @@ st.title("🔍 Search Research Papers")
 # -----------------------------
 search_mode = st.radio(
     "Search Mode",
-    ["🔍 Exact Match", "🧠 Semantic (AI)"],
+    ["⚡ Hybrid", "🔍 Exact Match", "🧠 Semantic (AI)"],
     horizontal=True
 )
 
@@ -25,18 +27,29 @@ query = st.text_input(
         "Search by title, abstract, keywords"
         if search_mode == "🔍 Exact Match"
         else "Search by concept or research idea"
+        if search_mode == "🧠 Semantic (AI)"
+        else "Search by keywords or concept"
     )
 )
 
 # -----------------------------
-# Exact Match Filters
+# Filters (Exact Match + Hybrid)
 # -----------------------------
 author_filter = ""
 year_filter = ""
+category_filter = ""
 
-if search_mode == "🔍 Exact Match":
+
+@st.cache_data(ttl=300)
+def category_options():
+    return sorted(c for c in papers_col.distinct("category") if c)
+
+
+if search_mode in ("🔍 Exact Match", "⚡ Hybrid"):
     author_filter = st.text_input("Filter by author (optional)")
     year_filter = st.text_input("Filter by year (optional)")
+if search_mode == "⚡ Hybrid":
+    category_filter = st.selectbox("Filter by category (optional)", [""] + category_options())
 
 # -----------------------------
 # Semantic Options
@@ -44,47 +57,103 @@ if search_mode == "🔍 Exact Match":
 top_k = 5
 if search_mode == "🧠 Semantic (AI)":
     top_k = st.slider("Number of results", 3, 10, 5)
+elif search_mode == "⚡ Hybrid":
+    top_k = st.slider("Number of results", 5, 50, 10)
 
 # -----------------------------
 # Search Action
 # -----------------------------
+PAGE_SIZE = 20
+
 if st.button("Search"):
     if search_mode == "🔍 Exact Match":
-        results = search_advanced(
-            query=query,
-            author=author_filter,
-            year=year_filter
-        )
-
-        st.write(f"Found {len(results)} results")
-
-        for r in results:
-            st.subheader(r.get("title", "Untitled"))
-            st.write("Authors:", ", ".join(r.get("authors", [])) or "Not available")
-            st.write("Year:", r.get("year", "N/A"))
-            st.write("Journal:", r.get("journal", "N/A"))
-
-            details_url = f"/Paper_Details?id={str(r['_id'])}"
-            st.markdown(f"[📄 View Details]({details_url})")
-            st.write("---")
-
+        # Remember the search so page buttons keep working across reruns
+        st.session_state["exact_search"] = {"query": query, "author": author_filter, "year": year_filter}
+        st.session_state["exact_cursors"] = [None]  # cursor of each visited page
+    elif search_mode == "⚡ Hybrid":
+        st.session_state["hybrid_pressed"] = True
     else:
-        results = semantic_search(query, top_k=top_k)
-
-        st.write(f"Found {len(results)} semantically similar papers")
+        st.session_state["semantic_pressed"] = True
+
+if search_mode == "🔍 Exact Match" and st.session_state.get("exact_search"):
+    params = st.session_state["exact_search"]
+    cursors = st.session_state["exact_cursors"]
+
+    page = search_advanced_page(
+        query=params["query"],
+        author=params["author"],
+        year=params["year"],
+        limit=PAGE_SIZE,
+        cursor=cursors[-1],
+        with_total=True
+    )
 
-        for score, r in results:
-            st.subheader(r.get("title", "Untitled"))
-            st.write(f"🧠 Similarity Score: {score:.3f}")
-            st.write("Year:", r.get("year", "N/A"))
-            st.write("Journal:", r.get("journal", "N/A"))
+    st.write(f"Found {page['total']} results (page {len(cursors)})")
+
+    for r in page["results"]:
+        st.subheader(r.get("title", "Untitled"))
+        st.write("Authors:", ", ".join(r.get("authors", [])) or "Not available")
+        st.write("Year:", r.get("year", "N/A"))
+        st.write("Journal:", r.get("journal", "N/A"))
+
+        details_url = f"/Paper_Details?id={str(r['_id'])}"
+        st.markdown(f"[📄 View Details]({details_url})")
+        st.write("---")
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if len(cursors) > 1 and st.button("⬅️ Previous page"):
+            cursors.pop()
+            st.rerun()
+    with next_col:
+        if page["next_cursor"] and st.button("Next page ➡️"):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+
+elif search_mode == "🧠 Semantic (AI)" and st.session_state.pop("semantic_pressed", False):
+    results = semantic_search(query, top_k=top_k)
+
+    st.write(f"Found {len(results)} semantically similar papers")
+
+    for score, r in results:
+        st.subheader(r.get("title", "Untitled"))
+        st.write(f"🧠 Similarity Score: {score:.3f}")
+        st.write("Year:", r.get("year", "N/A"))
+        st.write("Journal:", r.get("journal", "N/A"))
+
+        if r.get("abstract"):
+            st.write(r["abstract"][:500] + ("..." if len(r["abstract"]) > 500 else ""))
+
+        details_url = f"/Paper_Details?id={str(r['_id'])}"
+        st.markdown(f"[📄 View Details]({details_url})")
+        st.write("---")
+
+elif search_mode == "⚡ Hybrid" and st.session_state.pop("hybrid_pressed", False):
+    year = year_filter.strip()
+    if year and not year.isdigit():
+        st.warning("Year must be a number.")
+        st.stop()
+
+    # One request: keyword + semantic retrieval run together, filters are
+    # applied inside both, and the two rankings are fused (RRF)
+    results = hybrid_search(
+        query,
+        filters={"author": author_filter.strip(), "year": year, "category": category_filter},
+        top_k=top_k
+    )
 
-            if r.get("abstract"):
-                st.write(r["abstract"][:500] + ("..." if len(r["abstract"]) > 500 else ""))
+    st.write(f"Found {len(results)} results")
 
-            details_url = f"/Paper_Details?id={str(r['_id'])}"
-            st.markdown(f"[📄 View Details]({details_url})")
-            st.write("---")
+    for score, r in results:
+        st.subheader(r.get("title", "Untitled"))
+        st.caption("Matched by: " + " + ".join(r.get("matched_by", [])))
+        st.write("Authors:", ", ".join(r.get("authors", [])) or "Not available")
+        st.write("Year:", r.get("year", "N/A"))
+        st.write("Journal:", r.get("journal", "N/A"))
 
+        if r.get("abstract"):
+            st.write(r["abstract"][:500] + ("..." if len(r["abstract"]) > 500 else ""))
 
-       
+        details_url = f"/Paper_Details?id={str(r['_id'])}"
+        st.markdown(f"[📄 View Details]({details_url})")
+        st.write("---")
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from metascan.db import get_all_papers
+from metascan.db import paginate_papers
+from metascan.analytics import get_stats, UNCATEGORIZED
 
 
 
@@ -20,30 +21,21 @@ st.title("📊 System Analytics")
 st.set_page_config(page_title="Library Analytics", layout="wide")
 st.title("📊 Research Library Analytics")
 
-# 1. Fetch Data
-papers = get_all_papers()
-if not papers:
+# 1. Fetch Stats (a few counter documents kept current on every write)
+stats = get_stats()
+if not stats["total"]:
     st.info("No data yet. Upload papers first!")
     st.stop()
 
-df = pd.DataFrame(papers)
-
-# Ensure 'category' column exists (fill with 'Uncategorized' if missing)
-if "category" not in df.columns:
-    df["category"] = "Uncategorized"
-df["category"] = df["category"].fillna("Uncategorized")
-
 # ---------------------------------------------------------
 # 2. METRICS ROW
 # ---------------------------------------------------------
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Papers", len(df))
-col2.metric("Unique Authors", len(set([a for sublist in df['authors'] for a in sublist])))
-if "year" in df.columns:
-    # Filter out weird years (like 0)
-    valid_years = df[df["year"] > 0]["year"]
-    if not valid_years.empty:
-        col3.metric("Time Span", f"{int(valid_years.min())} - {int(valid_years.max())}")
+col1.metric("Total Papers", stats["total"])
+col2.metric("Unique Authors", stats["unique_authors"])
+if stats["years"]:
+    # Counters already skip weird years (like 0)
+    col3.metric("Time Span", f"{min(stats['years'])} - {max(stats['years'])}")
 
 st.divider()
 
@@ -54,9 +46,8 @@ c1, c2 = st.columns(2)
 
 with c1:
     st.subheader("📚 Topics Distribution")
-    # Group by category
-    cat_counts = df['category'].value_counts().reset_index()
-    cat_counts.columns = ["Category", "Count"]
+    cat_counts = pd.DataFrame(sorted(stats["categories"].items(), key=lambda kv: -kv[1]),
+                              columns=["Category", "Count"])
     
     # Pie Chart
     fig_pie = px.pie(cat_counts, values="Count", names="Category", hole=0.4, 
@@ -65,11 +56,8 @@ with c1:
 
 with c2:
     st.subheader("📅 Publication Timeline")
-    if "year" in df.columns:
-        year_counts = df['year'].value_counts().reset_index()
-        year_counts.columns = ["Year", "Count"]
-        # Filter valid years
-        year_counts = year_counts[year_counts["Year"] > 0].sort_values("Year")
+    if stats["years"]:
+        year_counts = pd.DataFrame(sorted(stats["years"].items()), columns=["Year", "Count"])
         
         # Bar Chart
         fig_bar = px.bar(year_counts, x="Year", y="Count", color="Count")
@@ -81,16 +69,8 @@ st.divider()
 # 4. KEYWORDS (Horizontal Bar)
 # ---------------------------------------------------------
 st.subheader("🏷 Top Keywords")
-all_keywords = []
-if "keywords" in df.columns:
-    for row in df["keywords"]:
-        if isinstance(row, list):
-            all_keywords.extend(row)
-
-if all_keywords:
-    kw_counts = pd.Series(all_keywords).value_counts().head(10).sort_values(ascending=True)
-    kw_df = kw_counts.reset_index()
-    kw_df.columns = ["Keyword", "Count"]
+if stats["top_keywords"]:
+    kw_df = pd.DataFrame(stats["top_keywords"], columns=["Keyword", "Count"]).sort_values("Count")
     
     fig_kw = px.bar(kw_df, x="Count", y="Keyword", orientation='h', title="Most Common Concepts")
     st.plotly_chart(fig_kw, use_container_width=True)
@@ -105,16 +85,24 @@ st.divider()
 st.subheader("🔎 Inspect Papers by Topic")
 
 # Get list of unique categories
-categories = ["All"] + sorted(df["category"].unique().tolist())
+categories = ["All"] + sorted(stats["categories"])
 
 # Dropdown to select topic
 selected_cat = st.selectbox("Select a Category to view papers:", categories)
 
-# Filter the DataFrame based on selection
+# Only the selected topic is fetched, newest first, capped at DRILLDOWN_LIMIT rows
+DRILLDOWN_LIMIT = 500
 if selected_cat == "All":
-    filtered_df = df
+    query = None
+elif selected_cat == UNCATEGORIZED:
+    query = {"category": {"$in": [None, "", UNCATEGORIZED]}}
 else:
-    filtered_df = df[df["category"] == selected_cat]
+    query = {"category": selected_cat}
+page = paginate_papers(query, limit=DRILLDOWN_LIMIT,
+                       projection={"title": 1, "year": 1, "authors": 1, "category": 1})
+filtered_df = pd.DataFrame(page["results"], columns=["title", "year", "authors", "category"])
+if page["next_cursor"]:
+    st.caption(f"Showing the {DRILLDOWN_LIMIT} most recent papers.")
 
 # Show the table
 st.dataframe(
@@ -126,4 +114,4 @@ st.dataframe(
         "year": st.column_config.NumberColumn("Year", format="%d"),
         "category": st.column_config.TextColumn("Category", width="small"),
     }
-)
\ No newline at end of file
+)
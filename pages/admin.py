@@ -1,5 +1,5 @@
 import streamlit as st
-from metascan.db import get_all_papers, delete_paper
+from metascan.db import paginate_papers, count_papers, delete_paper
 
 st.set_page_config(page_title="Admin Panel", layout="wide")
 
@@ -10,9 +10,22 @@ if "role" not in st.session_state or st.session_state["role"] != "admin":
 
 st.title("👮 Admin Moderation Panel")
 
-# 1. Fetch all papers
-papers = get_all_papers()
-st.info(f"Currently managing {len(papers)} papers.")
+PAGE_SIZE = 25
+
+# 1. Fetch one page, with just the fields this page shows
+st.info(f"Currently managing {count_papers()} papers.")
+
+if "admin_cursors" not in st.session_state:
+    st.session_state["admin_cursors"] = [None]  # cursor of each visited page
+cursors = st.session_state["admin_cursors"]
+
+page = paginate_papers(
+    limit=PAGE_SIZE,
+    cursor=cursors[-1],
+    projection={"title": 1, "uploaded_by": 1, "category": 1, "duplicate_of": 1}
+)
+papers = page["results"]
+st.caption(f"Page {len(cursors)}")
 
 st.divider()
 
@@ -30,9 +43,23 @@ for p in papers:
             uploader = p.get("uploaded_by", "Unknown (Admin?)")
             st.write(f"👤 **Uploaded by:** `{uploader}`")
             st.write(f"🏷️ Category: {p.get('category', 'General')}")
+            if p.get("duplicate_of"):
+                dup = p["duplicate_of"]
+                st.warning(f"Possible duplicate of `{dup['paper_id']}` ({dup['method']}, {dup['score']:.2f})")
             
         with c3:
             # The Delete Button
             if st.button("🗑️ Delete", key=f"del_{p['_id']}"):
                 delete_paper(p['_id'])
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+# 3. Page navigation
+prev_col, next_col = st.columns(2)
+with prev_col:
+    if len(cursors) > 1 and st.button("⬅️ Previous page"):
+        cursors.pop()
+        st.rerun()
+with next_col:
+    if page["next_cursor"] and st.button("Next page ➡️"):
+        cursors.append(page["next_cursor"])
+        st.rerun()